@@ -0,0 +1,137 @@
+import sys
+import numpy as np
+import pandas as pd
+from pnf_triggers import PnfAnalysis, BULLISH_NAMES, remove_duplicate_triggers, trigger_levels
+
+EVENT_COLUMNS = ["ticker", "pattern", "side", "column", "width", "price_level", "fire_date", "fire_bar",
+                 "entry_price"]
+
+
+def trigger_events(pnf_obj, ticker=None, raw=True):
+    # Returns one row per trigger of pnf_obj with the bar it would have fired on.
+    # The breakout column of a trigger (column, width) is column + width. The trigger fires on the first bar of
+    # that column where the box rounded High (Low for bearish triggers) passes the price level of the trigger
+    # (pnf_triggers.trigger_levels), so it never uses a bar after the closing bar of the breakout column.
+    # With raw=True the triggers are taken before the duplicates are removed: removing the double top before an
+    # ascending triple top needs columns that are not known yet when the double top fires.
+    if (pnf_obj.raw_trigger_list is None):
+        pnf_obj.check_triggers()
+    trigger_list = pnf_obj.raw_trigger_list if (raw) else remove_duplicate_triggers(pnf_obj.raw_trigger_list)
+    ticker = pnf_obj.ticker if (ticker is None) else ticker
+    if (trigger_list == []):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+
+    data = pnf_obj.data
+    box_size = pnf_obj.box_size
+    closes = pnf_obj.pnf_data.close.to_numpy()
+    names = np.array([trg[0] for trg in trigger_list])
+    columns = np.array([trg[1] for trg in trigger_list], dtype=np.int64)
+    widths = np.array([trg[2] for trg in trigger_list], dtype=np.int64)
+    bullish = np.isin(names, BULLISH_NAMES)
+    levels = trigger_levels(closes, columns, widths, bullish)
+
+    # Bars of each column: from the closing bar of the previous column (the reversal bar) to its own closing bar.
+    closing_bars = data.index.get_indexer(pd.DatetimeIndex(pnf_obj.closing_dates_list))
+    breakout = columns + widths
+    first_bars = np.where(breakout > 1, closing_bars[np.maximum(breakout - 2, 0)], 0)
+    last_bars = closing_bars[breakout - 1]
+
+    # Walk all breakout columns at once: bars of the columns are put one after the other.
+    lengths = last_bars - first_bars + 1
+    offsets = np.cumsum(lengths) - lengths
+    bars = np.repeat(first_bars, lengths) + (np.arange(lengths.sum()) - np.repeat(offsets, lengths))
+    rounded_high = box_size * np.round(data.High.to_numpy(dtype=float) / box_size)
+    rounded_low = box_size * np.round(data.Low.to_numpy(dtype=float) / box_size)
+    passed = np.where(np.repeat(bullish, lengths),
+                      rounded_high[bars] > np.repeat(levels, lengths),
+                      rounded_low[bars] < np.repeat(levels, lengths))
+    fire_bars = np.minimum.reduceat(np.where(passed, bars, np.iinfo(np.int64).max), offsets)
+    fire_bars = np.minimum(fire_bars, last_bars)
+
+    events = pd.DataFrame({"ticker": ticker,
+                           "pattern": names,
+                           "side": np.where(bullish, "bullish", "bearish"),
+                           "column": columns,
+                           "width": widths,
+                           "price_level": levels,
+                           "fire_date": data.index[fire_bars],
+                           "fire_bar": fire_bars,
+                           "entry_price": data.Close.to_numpy(dtype=float)[fire_bars]},
+                          columns=EVENT_COLUMNS)
+    return events.sort_values(["fire_bar", "column"], kind="stable", ignore_index=True)
+
+
+def add_forward_returns(events, data, horizons=(1, 5, 10, 20)):
+    # Adds return_<h> (Close h bars after the fire bar / entry price - 1) and hit_<h> (the price moved in the
+    # direction of the trigger) for each horizon h. Returns that need bars after the end of data are nan.
+    close = data.Close.to_numpy(dtype=float)
+    fire_bars = events.fire_bar.to_numpy(dtype=np.int64)
+    bullish = (events.side == "bullish").to_numpy()
+    events = events.copy()
+    for h in horizons:
+        exit_bars = fire_bars + h
+        exit_prices = np.full(len(events), np.nan)
+        exit_prices[exit_bars < len(close)] = close[exit_bars[exit_bars < len(close)]]
+        returns = exit_prices / events.entry_price.to_numpy(dtype=float) - 1
+        events["return_{}".format(h)] = returns
+        events["hit_{}".format(h)] = np.where(np.isnan(returns), np.nan, np.where(bullish, returns > 0, returns < 0))
+
+    return events
+
+
+def pattern_statistics(events, horizons=(1, 5, 10, 20)):
+    # Aggregates the events of any number of tickers: one row per (pattern, horizon) with the number of triggers
+    # with a forward return, the mean and median return and the hit rate.
+    tables = []
+    for h in horizons:
+        grouped = events.dropna(subset=["return_{}".format(h)]).groupby(["side", "pattern"])
+        table = grouped.agg(count=("return_{}".format(h), "size"),
+                            mean_return=("return_{}".format(h), "mean"),
+                            median_return=("return_{}".format(h), "median"),
+                            hit_rate=("hit_{}".format(h), "mean")).reset_index()
+        table.insert(2, "horizon", h)
+        tables.append(table)
+
+    return pd.concat(tables, ignore_index=True).sort_values(["side", "pattern", "horizon"], ignore_index=True)
+
+
+def backtest(pnf_obj_dic, horizons=(1, 5, 10, 20), raw=True):
+    # Replays the triggers of every ticker in pnf_obj_dic ({ticker: PnfAnalysis}).
+    # Returns (events, statistics): every trigger with its forward returns and the statistics per pattern.
+    tables = []
+    for ticker, pnf_obj in pnf_obj_dic.items():
+        events = trigger_events(pnf_obj, ticker=ticker, raw=raw)
+        if (len(events) > 0):
+            tables.append(add_forward_returns(events, pnf_obj.data, horizons))
+
+    if (tables == []):
+        events = add_forward_returns(pd.DataFrame(columns=EVENT_COLUMNS), pd.DataFrame({"Close": []}), horizons)
+    else:
+        events = pd.concat(tables, ignore_index=True)
+
+    return events, pattern_statistics(events, horizons)
+
+
+def random_walk_check(n_tickers=80, n_bars=2500, horizon=1, seed=0, z_limit=4.0):
+    # Look-ahead check: on random walks no trigger can predict the next bars, so the hit rate of every pattern has
+    # to stay close to 50%. A trigger that fires before its pattern exists (i.e. it uses later bars) shows up as a
+    # higher hit rate. Returns (statistics of the horizon with the z score of each hit rate, patterns whose hit rate
+    # is more than z_limit standard errors away from 50%).
+    from pnf_bench import random_ohlc
+
+    pnf_obj_dic = {"RW{}".format(k): PnfAnalysis("RW{}".format(k), get_data=False,
+                                                 data=random_ohlc(n_bars, seed=seed + k))
+                   for k in range(n_tickers)}
+    statistics = backtest(pnf_obj_dic, horizons=(horizon,))[1]
+    statistics["z_score"] = (statistics.hit_rate - 0.5) / (0.5 / np.sqrt(statistics["count"]))
+    failed = statistics.pattern[statistics.z_score.abs() > z_limit].tolist()
+    return statistics, failed
+
+
+if __name__ == '__main__':
+    # python pnf_backtest.py runs the look-ahead check on random walks:
+    statistics, failed = random_walk_check()
+    print(statistics.to_string(index=False))
+    if (failed != []):
+        print("Hit rates far from 50% on random walks (look-ahead?): {}".format(", ".join(failed)))
+        sys.exit(1)
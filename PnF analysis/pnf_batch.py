@@ -0,0 +1,59 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pnf_triggers import PnfAnalysis
+from pnf_metrics import ScanMetrics, NULL_METRICS
+
+
+def analyse_ticker(ticker, params, compact=False, metrics=None):
+    # Loads the data, builds the chart and checks the triggers of one ticker (runs in a worker process).
+    # With compact=True a CompactChart is returned instead of the PnfAnalysis (no bars, typed arrays).
+    pnf_obj = PnfAnalysis(ticker, metrics=metrics, **params)
+    trigger_list = pnf_obj.check_triggers()
+    if (compact):
+        from pnf_compact import CompactChart
+        pnf_obj = CompactChart.from_pnf(pnf_obj)
+    return ticker, pnf_obj, trigger_list
+
+
+def analyse_ticker_timed(ticker, params, compact=False):
+    # analyse_ticker with metrics of its own (in a worker process). Returns (result, metrics records), the records
+    # are not sent back a second time with the PnfAnalysis.
+    metrics = ScanMetrics()
+    result = analyse_ticker(ticker, params, compact, metrics)
+    if (not compact):
+        result[1].metrics = NULL_METRICS
+    return result, metrics.records
+
+
+def scan_tickers(ticker_list, processes=None, compact=False, metrics=None, **params):
+    # Runs analyse_ticker for every ticker on a pool of processes and yields (ticker, pnf_obj, trigger_list)
+    # as soon as each ticker is done. params are passed to PnfAnalysis (start_date, end_date, box_size, ...).
+    # processes=None uses every core, processes=1 runs in this process without a pool.
+    # With compact=True the charts are returned as CompactChart objects, to keep large universes in memory.
+    # Tickers that fail (no data, download errors, ...) are reported and skipped.
+    # With metrics (a pnf_metrics.ScanMetrics) the stage timings of the workers are collected in it and the returned
+    # PnfAnalysis objects record their next stages (triggers_between, plots, ...) in it.
+    if (processes == 1):
+        for ticker in ticker_list:
+            try:
+                yield analyse_ticker(ticker, params, compact, metrics)
+            except Exception as e:
+                print("Could not analyse {}: {}".format(ticker, e))
+        return
+
+    timed = (metrics is not None) and (metrics.enabled)
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        futures = {executor.submit(analyse_ticker_timed if (timed) else analyse_ticker, ticker, params, compact): ticker
+                   for ticker in ticker_list}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print("Could not analyse {}: {}".format(futures[future], e))
+                continue
+            if (timed):
+                result, records = result
+                metrics.merge(records)
+                if (not compact):
+                    result[1].metrics = metrics
+            yield result
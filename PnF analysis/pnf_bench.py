@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from pnf_triggers import PnfAnalysis, trigger_lines
+
+# Benchmarks the stages of a scan on synthetic data, no network is needed:
+#     python pnf_bench.py --tickers 20 --bars 2500 --save        (saves the numbers as the baseline)
+#     python pnf_bench.py --tickers 20 --bars 2500               (compares the numbers with the baseline)
+#     python pnf_bench.py --tickers 20 --bars 2500 --sweep       (also times 1, 2, 4, ... 20 tickers)
+
+STAGES = ["create_pnf_data", "check_triggers", "create_plot_from_pnf_data"]
+
+
+def random_ohlc(n_bars, volatility=0.02, start_price=50.0, start_date="2000-01-03", seed=None):
+    # Random walk of daily bars: the close moves with a normal daily return of std volatility and
+    # High / Low are spread around Open and Close.
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n_bars)))
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close,
+                         "Volume": rng.integers(1000, 100000, n_bars)},
+                        index=pd.bdate_range(start_date, periods=n_bars, name="Date"))
+
+
+def median_time(func, repeat, min_time=0.0):
+    # Median wall time of one call of func over repeat rounds. A round calls func as many times as needed to take at
+    # least min_time seconds, so stages of a few milliseconds are not timed on a single call. The first round finds
+    # the number of calls and counts as one of the rounds. The median moves much less from run to run than the best
+    # round, which makes the comparison with the baseline usable.
+    loops = 1
+    while (True):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if (elapsed >= min_time):
+            break
+        loops *= 2
+    times = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        times.append((time.perf_counter() - start) / loops)
+    return float(np.median(times))
+
+
+def run_benchmark(n_tickers=10, n_bars=2500, volatility=0.02, repeat=11, min_time=0.05, seed=0, plot=True):
+    # Returns {stage: {"seconds", "bars_per_second", "columns_per_second"}}, seconds is the time of the stage for all
+    # tickers (median of repeat rounds of at least min_time seconds, check median_time).
+    data_list = [random_ohlc(n_bars, volatility=volatility, seed=seed + k) for k in range(n_tickers)]
+    pnf_obj_list = [PnfAnalysis("SYN{}".format(k), data=data, get_data=False) for k, data in enumerate(data_list)]
+    n_columns = sum(len(pnf_obj.pnf_data) for pnf_obj in pnf_obj_list)
+
+    def create_all():
+        for pnf_obj, data in zip(pnf_obj_list, data_list):
+            pnf_obj.create_pnf_data(data)
+
+    def check_all():
+        for pnf_obj in pnf_obj_list:
+            pnf_obj.check_triggers()
+
+    seconds = {"create_pnf_data": median_time(create_all, repeat, min_time),
+               "check_triggers": median_time(check_all, repeat, min_time)}
+
+    if (plot):
+        import matplotlib.pyplot as plt
+        plt.switch_backend("Agg")
+        with tempfile.TemporaryDirectory() as folder:
+            lines_list = [trigger_lines(pnf_obj, pnf_obj.check_triggers()) for pnf_obj in pnf_obj_list]
+
+            def plot_all():
+                for pnf_obj, lines in zip(pnf_obj_list, lines_list):
+                    pnf_obj.create_plot_from_pnf_data(lines=lines,
+                                                      file_path=os.path.join(folder, pnf_obj.ticker + ".png"))
+
+            seconds["create_plot_from_pnf_data"] = median_time(plot_all, repeat, min_time)
+
+    results = {}
+    for stage in STAGES:
+        if (stage == "create_plot_from_pnf_data") and (not plot):
+            continue
+        results[stage] = {"seconds": seconds[stage],
+                          "bars_per_second": n_tickers * n_bars / seconds[stage],
+                          "columns_per_second": n_columns / seconds[stage]}
+
+    return results
+
+
+def sweep_counts(n_tickers):
+    # Ticker counts of a sweep: 1, 2, 4, ... and n_tickers.
+    counts = [2 ** k for k in range(int(np.log2(max(n_tickers, 1))) + 1) if (2 ** k < n_tickers)]
+    return counts + [n_tickers]
+
+
+def run_sweep(counts, **bench_params):
+    # run_benchmark for every number of tickers in counts (the first tickers of the largest run), to see how the
+    # stages scale with the size of the universe: {n_tickers: results}.
+    return {n_tickers: run_benchmark(n_tickers=n_tickers, **bench_params) for n_tickers in counts}
+
+
+def print_sweep(sweep):
+    # One line per ticker count with the seconds of each stage and the milliseconds per ticker:
+    stages = [stage for stage in STAGES if (stage in next(iter(sweep.values())))]
+    print("{:<9}".format("tickers") + "".join("{:>30}".format(stage) for stage in stages))
+    for n_tickers, results in sweep.items():
+        print("{:<9}".format(n_tickers) +
+              "".join("{:>30}".format("{:.4f} s, {:.2f} ms/ticker".format(results[stage]["seconds"],
+                                                                        1000 * results[stage]["seconds"] / n_tickers))
+                      for stage in stages))
+
+
+def compare_with_baseline(results, baseline, tolerance=0.1):
+    # Prints the change of throughput for each stage. Returns the stages that are slower than the baseline by
+    # more than tolerance (0.1 = 10%).
+    regressions = []
+    for stage in results:
+        if (stage not in baseline["results"]):
+            continue
+        ratio = results[stage]["bars_per_second"] / baseline["results"][stage]["bars_per_second"]
+        flag = ""
+        if (ratio < 1 - tolerance):
+            flag = "  <-- REGRESSION"
+            regressions.append(stage)
+        print("{:<28}{:>8.2f}x baseline{}".format(stage, ratio, flag))
+
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark of the pnf stages on random walk OHLC data.")
+    parser.add_argument("--tickers", type=int, default=10, help="number of synthetic tickers")
+    parser.add_argument("--bars", type=int, default=2500, help="number of daily bars for each ticker")
+    parser.add_argument("--volatility", type=float, default=0.02, help="std of the daily returns")
+    parser.add_argument("--repeat", type=int, default=11, help="the median of repeat rounds is used")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds of a round of each stage")
+    parser.add_argument("--sweep", action="store_true", help="also time 1, 2, 4, ... tickers up to --tickers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-plot", action="store_true", help="skip create_plot_from_pnf_data")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="baseline file")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slow down before a regression")
+    args = parser.parse_args(argv)
+
+    params = {"tickers": args.tickers, "bars": args.bars, "volatility": args.volatility, "seed": args.seed}
+    bench_params = {"n_bars": args.bars, "volatility": args.volatility, "repeat": args.repeat,
+                    "min_time": args.min_time, "seed": args.seed, "plot": not args.no_plot}
+    if (args.sweep):
+        sweep = run_sweep(sweep_counts(args.tickers), **bench_params)
+        print_sweep(sweep)
+        print()
+        results = sweep[args.tickers]
+    else:
+        results = run_benchmark(n_tickers=args.tickers, **bench_params)
+
+    print("{:<28}{:>12}{:>16}{:>16}".format("stage", "seconds", "bars/s", "columns/s"))
+    for stage, res in results.items():
+        print("{:<28}{:>12.4f}{:>16,.0f}{:>16,.0f}".format(stage, res["seconds"], res["bars_per_second"],
+                                                          res["columns_per_second"]))
+
+    if (args.save):
+        with open(args.baseline, "w") as f:
+            json.dump({"params": params, "results": results}, f, indent=1)
+        print("Baseline saved to {}".format(args.baseline))
+        return 0
+
+    if (os.path.exists(args.baseline)):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if (baseline["params"] != params):
+            print("Baseline was run with {}, the numbers are not comparable".format(baseline["params"]))
+            return 0
+        print()
+        if (compare_with_baseline(results, baseline, tolerance=args.tolerance) != []):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from pnf_triggers import PnfAnalysis, BULLISH_NAMES, pnf_columns, find_triggers
+from pnf_backtest import trigger_events
+
+BREADTH_COLUMNS = ["bullish", "bearish", "total", "bullish_percent"]
+
+
+def signal_events(pnf_obj_dic, raw=True):
+    # One row per signal of every ticker ({ticker: PnfAnalysis}): ticker, date and signal (1 bullish, -1 bearish).
+    # The date is the bar the trigger fires on (pnf_backtest.trigger_events), so a signal never uses later bars.
+    tables = []
+    for ticker, pnf_obj in pnf_obj_dic.items():
+        events = trigger_events(pnf_obj, ticker=ticker, raw=raw)
+        tables.append(pd.DataFrame({"ticker": ticker,
+                                    "date": pd.DatetimeIndex(events.fire_date),
+                                    "signal": np.where(events.side == "bullish", 1, -1)}))
+
+    if (tables == []):
+        return pd.DataFrame({"ticker": [], "date": pd.DatetimeIndex([]), "signal": []})
+    return pd.concat(tables, ignore_index=True)
+
+
+def signal_states(pnf_obj_dic, raw=True):
+    # Signal of every ticker on every date (dates x tickers): the signal of its last trigger up to that date,
+    # 1 for bullish and -1 for bearish. Dates before the first signal of a ticker or outside its bars are nan.
+    # The dates are the union of the bar dates of all tickers.
+    tickers = list(pnf_obj_dic)
+    dates = universe_dates(pnf_obj_dic)
+    events = signal_events(pnf_obj_dic, raw=raw)
+
+    # The last signal of each ticker on each date, then carried forward to the next signals:
+    events = events.drop_duplicates(["ticker", "date"], keep="last")
+    states = events.pivot(index="date", columns="ticker", values="signal")
+    states = states.reindex(index=dates, columns=tickers).ffill()
+
+    # No state outside the bars of a ticker (before its first bar, after its last bar):
+    first_dates = np.array([pnf_obj.data.index[0] for pnf_obj in pnf_obj_dic.values()], dtype="datetime64[ns]")
+    last_dates = np.array([pnf_obj.data.index[-1] for pnf_obj in pnf_obj_dic.values()], dtype="datetime64[ns]")
+    inside = (dates.values[:, None] >= first_dates[None, :]) & (dates.values[:, None] <= last_dates[None, :])
+    return states.where(inside)
+
+
+def bullish_percent(pnf_obj_dic, raw=True):
+    # Bullish percent index of the universe: for every date the number of tickers on a bullish and on a bearish
+    # signal, their total and 100 * bullish / total (nan while no ticker has a signal).
+    states = signal_states(pnf_obj_dic, raw=raw)
+    index = states.index
+    states = states.to_numpy()
+    bullish = (states == 1).sum(axis=1)
+    bearish = (states == -1).sum(axis=1)
+    total = bullish + bearish
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent = np.where(total > 0, 100 * bullish / total, np.nan)
+    return pd.DataFrame({"bullish": bullish, "bearish": bearish, "total": total, "bullish_percent": percent},
+                        index=index, columns=BREADTH_COLUMNS)
+
+
+def replay_states(pnf_obj):
+    # Slow reference for the signals of one chart: the chart is built again from the bars up to every date, so only
+    # what was known on that date is used. The signal of a date is the side (1 / -1) of the last trigger that
+    # appeared on the chart up to that date. Returns a Series indexed by the bar dates (nan before the first one).
+    high = pnf_obj.data.High.to_numpy(dtype=float)
+    low = pnf_obj.data.Low.to_numpy(dtype=float)
+    box_size = pnf_obj.box_size
+    known = set()
+    states = np.full(len(high), np.nan)
+    state = np.nan
+    for k in range(len(high)):
+        opens, closes, positions = pnf_columns(high[:k + 1], low[:k + 1], box_size, pnf_obj.reversal_amount)
+        opens = box_size * np.round(opens / box_size)
+        closes = box_size * np.round(closes / box_size)
+        # find_triggers never uses the last column as a breakout column, an empty one is added after the column in
+        # progress so that a breakout is seen on the bar it happens:
+        found = find_triggers(np.append(closes, np.nan), np.append(~(opens > closes), False),
+                              spread_trigger_wide=pnf_obj.spread_trigger_wide)
+        new = [trg for trg in found if trg not in known]
+        if (new != []):
+            known.update(new)
+            state = 1 if (new[-1][0] in BULLISH_NAMES) else -1
+        states[k] = state
+    return pd.Series(states, index=pnf_obj.data.index)
+
+
+def replay_check(pnf_obj_dic):
+    # Compares signal_states with replay_states for every ticker. Returns the tickers with a different signal on
+    # some date before their last bar (a breakout on the last bar is only seen by the replay).
+    states = signal_states(pnf_obj_dic)
+    different = []
+    for ticker, pnf_obj in pnf_obj_dic.items():
+        expected = replay_states(pnf_obj).iloc[:-1]
+        actual = states[ticker].reindex(expected.index)
+        if (not np.array_equal(actual.to_numpy(), expected.to_numpy(), equal_nan=True)):
+            different.append(ticker)
+    return different
+
+
+def universe_dates(pnf_obj_dic):
+    # Union of the bar dates of all tickers:
+    dates = np.unique(np.concatenate([pnf_obj.data.index.as_unit("ns").asi8 for pnf_obj in pnf_obj_dic.values()]))
+    return pd.DatetimeIndex(dates.view("datetime64[ns]"), name="Date")
+
+
+def breadth_chart(breadth, column="bullish_percent", box_size=2, reversal_amount=3, spread_trigger_wide=15,
+                  name="Bullish Percent"):
+    # Point and figure chart of a breadth series (e.g. bullish_percent output), as a PnfAnalysis on
+    # High = Low = Close = the series. Bullish percent charts are usually drawn with 2 point boxes and 3 box reversals.
+    series = breadth[column].dropna()
+    data = pd.DataFrame({"High": series, "Low": series, "Close": series}, index=series.index)
+    return PnfAnalysis(name, reversal_amount=reversal_amount, box_size=box_size, spread_trigger_wide=spread_trigger_wide,
+                       get_data=False, data=data)
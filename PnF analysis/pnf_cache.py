@@ -0,0 +1,120 @@
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+
+
+class ResultCache():
+    # Results of create_pnf_data and check_triggers, keyed by ticker, a hash of the bars (data_hash) and the chart
+    # parameters. Two tiers:
+    #     memory: the last max_items results (least recently used ones are dropped first)
+    #     disk:   one pickle file per result in directory, the least recently used files are deleted when they take
+    #             more than max_bytes
+    # The disk tier is shared by the processes of a scan and kept between runs. get returns the stored value itself
+    # from the memory tier, so values must not be changed after put: PnfAnalysis stores tuples and copies, and takes
+    # its own copies on a hit.
+    def __init__(self, directory="downloaded_data/cache", max_items=256, max_bytes=512 * 2 ** 20):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.disk_bytes = None  # size of the disk tier, read from the directory when first needed
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # A copy sent to a worker process starts with an empty memory tier:
+        state = self.__dict__.copy()
+        state["memory"] = OrderedDict()
+        return state
+
+    @staticmethod
+    def key(*parts):
+        # e.g. key("columns", ticker, data_hash, box_size, reversal_amount):
+        return hashlib.blake2b(repr(parts).encode(), digest_size=20).hexdigest()
+
+    def file_path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        # Returns the cached value or None:
+        if (key in self.memory):
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        try:
+            with open(self.file_path(key), "rb") as f:
+                value = pickle.load(f)
+            # The modification time is the last use of a file for the eviction:
+            os.utime(self.file_path(key))
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self.remember(key, value)
+
+        # Write to a temporary file first and then replace, so other processes never read half written files:
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.file_path(key), os.getpid())
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, self.file_path(key))
+
+        if (self.disk_bytes is None):
+            self.disk_bytes = self.disk_usage()[1]
+        else:
+            self.disk_bytes += size
+        if (self.disk_bytes > self.max_bytes):
+            self.evict_disk()
+
+    def remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while (len(self.memory) > self.max_items):
+            self.memory.popitem(last=False)
+
+    def disk_usage(self):
+        # ([(last use, size, path), ...] of the cache files, total size):
+        files = []
+        if (os.path.isdir(self.directory)):
+            for entry in os.scandir(self.directory):
+                if (entry.name.endswith(".pkl")):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files, sum(size for _, size, _ in files)
+
+    def evict_disk(self):
+        # Deletes the least recently used files until the disk tier fits in max_bytes. The directory is read again,
+        # other processes may have added or deleted files.
+        files, total = self.disk_usage()
+        for _, size, path in sorted(files):
+            if (total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self.disk_bytes = total
+
+    def clear(self):
+        self.memory.clear()
+        for _, _, path in self.disk_usage()[0]:
+            os.remove(path)
+        self.disk_bytes = 0
+
+
+def data_hash(data):
+    # Hash of the dates and the High, Low and Close prices of a DataFrame (the inputs of the chart):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(data.index.as_unit("ns").asi8.tobytes())
+    for col in ["High", "Low", "Close"]:
+        digest.update(data[col].to_numpy(dtype=float).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from pnf_triggers import find_triggers, remove_duplicate_triggers
+
+
+class CompactChart():
+    # Chart kept in typed arrays, for holding many instruments in one process:
+    #     open_boxes, close_boxes: int32 box numbers (price = box number * box_size)
+    #     closing_dates:           int64 closing dates of the columns (nanoseconds since epoch)
+    #     direction_bits:          one bit per column, 1 for "X" columns (np.packbits)
+    # It has pnf_data, closing_dates_list and box_size like PnfAnalysis, so trigger_lines, trigger_rows and
+    # render_charts work on it directly. The bars (PnfAnalysis.data) are not kept.
+    __slots__ = ("ticker", "box_size", "reversal_amount", "spread_trigger_wide", "open_boxes", "close_boxes",
+                 "closing_dates", "direction_bits", "n_columns", "raw_trigger_list")
+
+    def __init__(self, ticker, box_size, reversal_amount, open_boxes, close_boxes, closing_dates,
+                 spread_trigger_wide=15):
+        self.ticker = ticker
+        self.box_size = box_size
+        self.reversal_amount = reversal_amount
+        self.spread_trigger_wide = spread_trigger_wide
+        self.open_boxes = np.ascontiguousarray(open_boxes, dtype=np.int32)
+        self.close_boxes = np.ascontiguousarray(close_boxes, dtype=np.int32)
+        self.closing_dates = np.ascontiguousarray(closing_dates, dtype=np.int64)
+        self.n_columns = len(self.close_boxes)
+        # Type of a column is "X" unless its open is above its close (as in check_triggers):
+        self.direction_bits = np.packbits(~(self.open_boxes > self.close_boxes))
+        self.raw_trigger_list = None
+
+    @classmethod
+    def from_pnf(cls, pnf_obj):
+        # From a PnfAnalysis (its pnf_data is already on the box grid):
+        return cls.from_columns(pnf_obj.ticker, pnf_obj.pnf_data.open.to_numpy(), pnf_obj.pnf_data.close.to_numpy(),
+                                pnf_obj.closing_dates_list, pnf_obj.box_size, pnf_obj.reversal_amount,
+                                spread_trigger_wide=pnf_obj.spread_trigger_wide)
+
+    @classmethod
+    def from_columns(cls, ticker, opens, closes, closing_dates, box_size, reversal_amount, spread_trigger_wide=15):
+        # From open / close prices (e.g. pnf_columns output), they are rounded to the box grid:
+        return cls(ticker, box_size, reversal_amount,
+                   np.round(np.asarray(opens, dtype=float) / box_size),
+                   np.round(np.asarray(closes, dtype=float) / box_size),
+                   pd.DatetimeIndex(closing_dates).as_unit("ns").asi8,
+                   spread_trigger_wide=spread_trigger_wide)
+
+    @property
+    def is_x(self):
+        return np.unpackbits(self.direction_bits, count=self.n_columns).astype(bool)
+
+    @property
+    def columns(self):
+        return np.arange(1, self.n_columns + 1)
+
+    @property
+    def opens(self):
+        return self.box_size * self.open_boxes.astype(float)
+
+    @property
+    def closes(self):
+        return self.box_size * self.close_boxes.astype(float)
+
+    @property
+    def closing_dates_list(self):
+        return pd.DatetimeIndex(self.closing_dates.view("datetime64[ns]"))
+
+    @property
+    def pnf_data(self):
+        # Same frame as PnfAnalysis.pnf_data (prices on the box grid, columns numbered from 1):
+        return pd.DataFrame({"open": self.opens, "close": self.closes},
+                            index=pd.RangeIndex(1, self.n_columns + 1, name="rownbr"), copy=False)
+
+    @property
+    def nbytes(self):
+        return self.open_boxes.nbytes + self.close_boxes.nbytes + self.closing_dates.nbytes + self.direction_bits.nbytes
+
+    def to_frame(self, copy=False):
+        # Box numbers, directions and closing dates as a DataFrame. With copy=False the open / close box columns
+        # share memory with the chart.
+        return pd.DataFrame({"open_box": self.open_boxes,
+                             "close_box": self.close_boxes,
+                             "is_x": self.is_x,
+                             "closing_date": self.closing_dates.view("datetime64[ns]")},
+                            index=pd.RangeIndex(1, self.n_columns + 1, name="rownbr"), copy=copy)
+
+    def check_triggers(self):
+        # Same trigger list as PnfAnalysis.check_triggers, computed on the box numbers:
+        self.raw_trigger_list = find_triggers(self.close_boxes, self.is_x, spread_trigger_wide=self.spread_trigger_wide)
+        return remove_duplicate_triggers(self.raw_trigger_list)
+
+    def create_plot_from_pnf_data(self, figure_size=(18, 15), chart_name="Point and Figure Chart", grid_freq_y=1,
+                                  grid_freq_x=1, lines=list(), file_path=None):
+        # Same arguments as PnfAnalysis.create_plot_from_pnf_data:
+        from pnf_render import draw_pnf, render_chart
+
+        if (file_path is not None):
+            render_chart(self.opens, self.closes, self.box_size, self.columns, file_path, chart_name=chart_name,
+                         figure_size=figure_size, grid_freq_y=grid_freq_y, grid_freq_x=grid_freq_x, lines=lines)
+            return
+
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=figure_size)
+        draw_pnf(ax, self.opens, self.closes, self.box_size, self.columns, chart_name=chart_name,
+                 grid_freq_y=grid_freq_y, grid_freq_x=grid_freq_x, lines=lines)
+        fig.show()
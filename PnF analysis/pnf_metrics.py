@@ -0,0 +1,120 @@
+import json
+import time
+import pandas as pd
+
+RECORD_FIELDS = ["ticker", "stage", "seconds", "bars", "columns", "triggers"]
+
+
+class ScanMetrics():
+    # Wall time of every stage of a scan, per ticker, with the counts known at that stage. One record per stage run:
+    #     {"ticker": ..., "stage": ..., "seconds": ..., "bars": ..., "columns": ..., "triggers": ...}
+    # Stages: download (pnf_sources), import_data, create_pnf_data, check_triggers, triggers_between, plot.
+    # Counts that do not apply to a stage are None.
+    enabled = True
+
+    def __init__(self):
+        self.records = []
+
+    def stage(self, ticker, stage):
+        # Times a with block. The counts can be set on the returned dictionary:
+        #     with metrics.stage(ticker, "check_triggers") as counts:
+        #         ...
+        #         counts["triggers"] = len(trigger_list)
+        return StageTimer(self, ticker, stage)
+
+    def record(self, ticker, stage, seconds, bars=None, columns=None, triggers=None):
+        self.records.append({"ticker": ticker, "stage": stage, "seconds": seconds, "bars": bars,
+                             "columns": columns, "triggers": triggers})
+
+    def merge(self, records):
+        # Adds the records of another ScanMetrics (e.g. from a worker process):
+        self.records.extend(records)
+
+    def to_frame(self):
+        return pd.DataFrame(self.records, columns=RECORD_FIELDS)
+
+    def stage_summary(self):
+        # One row per stage: number of runs, total, mean and max seconds:
+        return self.to_frame().groupby("stage", sort=False).seconds.agg(["count", "sum", "mean", "max"])
+
+    def slowest(self, stage, n=10):
+        # The n tickers that spent the most time in a stage (to find the outliers):
+        df = self.to_frame()
+        return df[df.stage == stage].groupby("ticker").seconds.sum().nlargest(n)
+
+    def write_jsonl(self, file_path):
+        with open(file_path, "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+    def write_prometheus(self, file_path):
+        # Prometheus text format (for the node exporter textfile collector): seconds per (ticker, stage) and the
+        # last known counts per ticker.
+        seconds = {}
+        counts = {"bars": {}, "columns": {}, "triggers": {}}
+        for record in self.records:
+            key = (record["ticker"], record["stage"])
+            seconds[key] = seconds.get(key, 0.0) + record["seconds"]
+            for name in counts:
+                if (record[name] is not None):
+                    counts[name][record["ticker"]] = record[name]
+
+        lines = ["# HELP pnf_stage_seconds Wall time spent in a stage of the scan.",
+                 "# TYPE pnf_stage_seconds gauge"]
+        for (ticker, stage), value in seconds.items():
+            lines.append('pnf_stage_seconds{{ticker="{}",stage="{}"}} {}'.format(ticker, stage, value))
+        for name, values in counts.items():
+            lines.append("# HELP pnf_{} Number of {} of the ticker.".format(name, name))
+            lines.append("# TYPE pnf_{} gauge".format(name))
+            for ticker, value in values.items():
+                lines.append('pnf_{}{{ticker="{}"}} {}'.format(name, ticker, value))
+
+        with open(file_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+class StageTimer():
+    __slots__ = ("metrics", "ticker", "stage", "counts", "start")
+
+    def __init__(self, metrics, ticker, stage):
+        self.metrics = metrics
+        self.ticker = ticker
+        self.stage = stage
+        self.counts = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.counts
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self.ticker, self.stage, time.perf_counter() - self.start, **self.counts)
+        return False
+
+
+class NullMetrics():
+    # Used when the metrics are disabled: stage() returns a shared do-nothing timer, record() ignores its arguments.
+    enabled = False
+    records = ()
+
+    def stage(self, ticker, stage):
+        return NULL_TIMER
+
+    def record(self, ticker, stage, seconds, bars=None, columns=None, triggers=None):
+        pass
+
+    def merge(self, records):
+        pass
+
+
+class NullTimer():
+    __slots__ = ()
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = NullTimer()
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,102 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+from matplotlib.ticker import (AutoMinorLocator)
+
+
+def pnf_boxes(opens, closes, box_size, columns):
+    # Returns the box positions of all columns at once as (x_values, y_values, is_x).
+    # A column gets the boxes np.arange(min(open, close), max(open, close), box_size) at x = its column number,
+    # "X" boxes if close > open and "o" boxes otherwise (columns with open == close have no boxes).
+    opens = np.asarray(opens, dtype=float)
+    closes = np.asarray(closes, dtype=float)
+    lows = np.minimum(opens, closes)
+    highs = np.maximum(opens, closes)
+
+    # Same box count and steps as np.arange (it steps with (start + step) - start):
+    counts = np.ceil((highs - lows) / box_size).astype(np.int64)
+    counts[counts < 0] = 0
+    steps = (lows + box_size) - lows
+    first_box = np.cumsum(counts) - counts
+    box_number = np.arange(counts.sum()) - np.repeat(first_box, counts)
+
+    x_values = np.repeat(np.asarray(columns), counts)
+    y_values = np.repeat(lows, counts) + box_number * np.repeat(steps, counts)
+    is_x = np.repeat(closes > opens, counts)
+    return x_values, y_values, is_x
+
+
+def draw_pnf(ax, opens, closes, box_size, columns, chart_name="Point and Figure Chart", grid_freq_y=1,
+             grid_freq_x=1, lines=()):
+    # Draws all "X" boxes and all "o" boxes with one scatter call each and the trigger lines as one collection.
+    # lines format: ( x_start, x_end, y_start, y_end )
+    x_values, y_values, is_x = pnf_boxes(opens, closes, box_size, columns)
+    ax.scatter(x_values[is_x], y_values[is_x], marker="X", s=100, color="g", edgecolor="w", linewidth=0.8)
+    ax.scatter(x_values[~is_x], y_values[~is_x], marker="o", s=100, color="r", edgecolor="w", linewidth=0.8)
+
+    ax.set_ylabel("Price Level")
+    ax.set_title(chart_name)
+    ax.yaxis.set_minor_locator(AutoMinorLocator(grid_freq_y))
+    ax.xaxis.set_minor_locator(AutoMinorLocator(grid_freq_x))
+
+    ax.grid(visible=True, which='major', linestyle='--')
+    ax.grid(visible=True, which='minor', linestyle=':')
+
+    # Draw the lines:
+    if (len(lines) > 0):
+        ax.add_collection(LineCollection([((i[0], i[2]), (i[1], i[3])) for i in lines], colors="blue",
+                                         linewidths=1.5))
+        ax.autoscale_view()
+
+
+def render_chart(opens, closes, box_size, columns, file_path, chart_name="Point and Figure Chart",
+                 figure_size=(12, 6), grid_freq_y=5, grid_freq_x=5, lines=()):
+    # Saves a chart to file_path (png, svg, ... from the extension). It does not use pyplot, so no GUI backend
+    # is needed and it is safe to run in worker processes.
+    fig = Figure(figsize=figure_size)
+    ax = fig.subplots()
+    draw_pnf(ax, opens, closes, box_size, columns, chart_name=chart_name, grid_freq_y=grid_freq_y,
+             grid_freq_x=grid_freq_x, lines=lines)
+    fig.savefig(file_path)
+    return file_path
+
+
+def render_chart_timed(*args, **kwargs):
+    # render_chart that also returns its wall time, (file_path, seconds):
+    start = time.perf_counter()
+    file_path = render_chart(*args, **kwargs)
+    return file_path, time.perf_counter() - start
+
+
+def render_charts(pnf_obj_dic, stock_triggers, directory, file_format="png", processes=None, metrics=None,
+                  **plot_kwargs):
+    # Saves the chart of every ticker in pnf_obj_dic to directory/<ticker>.<file_format> on a pool of processes,
+    # with the lines of its triggers in stock_triggers (if any). Yields the file paths as they are written.
+    # The time of each chart is recorded as the "plot" stage in metrics (pnf_metrics.ScanMetrics), if given.
+    from pnf_triggers import trigger_lines
+    from pnf_metrics import NULL_METRICS
+
+    metrics = NULL_METRICS if (metrics is None) else metrics
+
+    os.makedirs(directory, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        futures = {}
+        for ticker, pnf_obj in pnf_obj_dic.items():
+            pnf_data = pnf_obj.pnf_data
+            future = executor.submit(render_chart_timed,
+                                     pnf_data.open.to_numpy(),
+                                     pnf_data.close.to_numpy(),
+                                     pnf_obj.box_size,
+                                     pnf_data.index.to_numpy(),
+                                     os.path.join(directory, "{}.{}".format(ticker, file_format)),
+                                     chart_name=ticker,
+                                     lines=trigger_lines(pnf_obj, stock_triggers.get(ticker, [])),
+                                     **plot_kwargs)
+            futures[future] = (ticker, len(pnf_data))
+        for future in as_completed(futures):
+            file_path, seconds = future.result()
+            metrics.record(futures[future][0], "plot", seconds, columns=futures[future][1])
+            yield file_path
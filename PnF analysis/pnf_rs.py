@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from pnf_triggers import default_box_size
+from pnf_compact import CompactChart
+
+MATRIX_BLOCK = 256  # rows of the ratio matrix computed at once while looking for the first streaks
+
+
+def close_matrix(data_dic):
+    # Closing prices of all tickers ({ticker: DataFrame}) on the union of their dates (dates x tickers).
+    # Missing closes after the first bar of a ticker are forward filled, before it they stay nan.
+    closes = pd.concat({ticker: df.Close for ticker, df in data_dic.items()}, axis=1).sort_index()
+    return closes.ffill()
+
+
+def pair_ratios(closes, first_tickers, second_tickers, starts, bases, rows):
+    # Relative strength of the pairs on the given rows: 100 * (close_a / close_b) / base, where base is
+    # close_a / close_b on the first bar where both tickers have a close (starts), so every ratio series starts
+    # at 100. Rows before the start of a pair are nan.
+    ratios = 100 * (closes[rows][:, first_tickers] / closes[rows][:, second_tickers]) / bases
+    ratios[rows[:, None] < starts[None, :]] = np.nan
+    return ratios
+
+
+def rs_columns(closes, first_tickers, second_tickers, box_sizes, reversal_amount):
+    # Builds the columns of every pair (a = first_tickers[p], b = second_tickers[p]) on its ratio series, from the
+    # closing prices (closes: dates x tickers array). Same columns as pnf_triggers.pnf_columns on each ratio series
+    # (with High = Low = ratio), but the bars are walked once for all pairs together with array operations.
+    # box_sizes has the box size of each pair (None: default_box_size of the last ratio of each pair).
+    # Returns a list with (opens, closes, positions) for each pair, positions are rows of closes (the last column is
+    # the one in progress), or None for a pair without a common bar.
+    n_rows = closes.shape[0]
+    n_pairs = len(first_tickers)
+    valid = ~np.isnan(closes)
+    first_valid = np.where(valid.any(axis=0), valid.argmax(axis=0), n_rows)
+    starts = np.maximum(first_valid[first_tickers], first_valid[second_tickers])
+    has_data = starts < n_rows
+    starts = np.minimum(starts, n_rows - 1)
+    bases = closes[starts, first_tickers] / closes[starts, second_tickers]
+    if (box_sizes is None):
+        last_ratio = 100 * (closes[-1, first_tickers] / closes[-1, second_tickers]) / bases
+        box_sizes = np.array([default_box_size(ratio) for ratio in last_ratio.tolist()], dtype=float)
+    reversal_range = (reversal_amount + 1) * box_sizes
+
+    # First streak of each pair (as pnf_triggers.first_pnf_streak): running highest and lowest ratios from the
+    # start until they are (reversal_amount + 1) boxes apart. It is searched on blocks of rows.
+    first_ratio = 100 * (closes[starts, first_tickers] / closes[starts, second_tickers]) / bases
+    highest = np.full(n_pairs, np.nan)
+    lowest = np.full(n_pairs, np.nan)
+    decided = ~has_data
+    for first_row in range(0, n_rows, MATRIX_BLOCK):
+        rows = np.arange(first_row, min(first_row + MATRIX_BLOCK, n_rows))
+        ratios = pair_ratios(closes, first_tickers, second_tickers, starts, bases, rows)
+        block_highest = np.fmax(np.fmax.accumulate(ratios, axis=0), highest)
+        block_lowest = np.fmin(np.fmin.accumulate(ratios, axis=0), lowest)
+        reached = (block_highest - block_lowest) >= reversal_range
+        stop = np.where(reached.any(axis=0), reached.argmax(axis=0), len(rows) - 1)
+        highest = np.where(decided, highest, block_highest[stop, np.arange(n_pairs)])
+        lowest = np.where(decided, lowest, block_lowest[stop, np.arange(n_pairs)])
+        decided = decided | reached.any(axis=0)
+        if (decided.all()):
+            break
+
+    # If the highest ratio is increased more than the lowest one decreased, the first streak is "X":
+    is_x = (highest - first_ratio) > (first_ratio - lowest)
+    pnf_open = first_ratio.copy()
+    pnf_close = np.where(is_x, highest, lowest)
+
+    # Then the streaks of all pairs are continued bar by bar (as pnf_triggers.extend_pnf_columns):
+    recorded = []
+    for row in range(1, n_rows):
+        ratio = pair_ratios(closes, first_tickers, second_tickers, starts, bases, np.array([row]))[0]
+        active = row > starts
+        x_streak = active & is_x
+        o_streak = active & ~is_x
+        pnf_close = np.where((x_streak & (ratio > pnf_close)) | (o_streak & (ratio < pnf_close)), ratio, pnf_close)
+        reversal_x = x_streak & (ratio < pnf_close - reversal_range)
+        reversal_o = o_streak & (ratio > pnf_close + reversal_range)
+        reversal = reversal_x | reversal_o
+        if (reversal.any()):
+            pairs = np.flatnonzero(reversal)
+            recorded.append((pairs, pnf_open[pairs], pnf_close[pairs], np.full(len(pairs), row)))
+            pnf_open = np.where(reversal_x, pnf_close - box_sizes, np.where(reversal_o, pnf_close + box_sizes, pnf_open))
+            pnf_close = np.where(reversal, ratio, pnf_close)
+            is_x = is_x ^ reversal
+
+    # Split the closed columns by pair (they are recorded in time order) and add the column in progress:
+    if (recorded != []):
+        pairs, opens, closes_, positions = [np.concatenate(part) for part in zip(*recorded)]
+    else:
+        pairs, opens, closes_, positions = np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    order = np.argsort(pairs, kind="stable")
+    bounds = np.searchsorted(pairs[order], np.arange(n_pairs + 1))
+    columns = []
+    for p in range(n_pairs):
+        if (not has_data[p]):
+            columns.append(None)
+            continue
+        part = order[bounds[p]:bounds[p + 1]]
+        columns.append((np.append(opens[part], pnf_open[p]),
+                        np.append(closes_[part], pnf_close[p]),
+                        np.append(positions[part], n_rows - 1)))
+    return columns, box_sizes
+
+
+def rs_charts(data_dic, pairs, box_size=None, reversal_amount=3, spread_trigger_wide=15):
+    # Relative strength charts of the pairs [(ticker_a, ticker_b), ...] from the bars in data_dic
+    # ({ticker: DataFrame with a Close column}, e.g. from load_universe). The chart of a pair is built on
+    # 100 * (close_a / close_b) rebased to 100 at the first common bar, so one box_size fits every pair
+    # (None: default_box_size of the last ratio of each pair).
+    # Returns {(ticker_a, ticker_b): CompactChart}, the chart ticker is "ticker_a/ticker_b". Pairs without a common
+    # bar are left out. The triggers of a chart are found with chart.check_triggers().
+    tickers = sorted(set(ticker for pair in pairs for ticker in pair))
+    closes = close_matrix({ticker: data_dic[ticker] for ticker in tickers})
+    position = {ticker: k for k, ticker in enumerate(closes.columns)}
+    first_tickers = np.array([position[pair[0]] for pair in pairs], dtype=np.int64)
+    second_tickers = np.array([position[pair[1]] for pair in pairs], dtype=np.int64)
+    box_sizes = None if (box_size is None) else np.full(len(pairs), float(box_size))
+
+    columns, box_sizes = rs_columns(closes.to_numpy(dtype=float), first_tickers, second_tickers, box_sizes,
+                                    reversal_amount)
+    # The charts are made from box numbers and nanosecond dates directly (as CompactChart.from_columns does):
+    dates = pd.DatetimeIndex(closes.index).as_unit("ns").asi8
+    charts = {}
+    for pair, pair_columns, pair_box_size in zip(pairs, columns, box_sizes.tolist()):
+        if (pair_columns is None):
+            continue
+        opens, closes_, positions = pair_columns
+        charts[tuple(pair)] = CompactChart("{}/{}".format(pair[0], pair[1]), pair_box_size, reversal_amount,
+                                           np.round(opens / pair_box_size), np.round(closes_ / pair_box_size),
+                                           dates[positions], spread_trigger_wide=spread_trigger_wide)
+    return charts
+
+
+def rs_matrix(data_dic, tickers=None, box_size=None, reversal_amount=3, spread_trigger_wide=15):
+    # Relative strength charts of every ordered pair of tickers (N x (N - 1) charts).
+    # Returns (charts, table): charts as in rs_charts, and a tickers x tickers table with the type ("X" or "O") of
+    # the last column of each ticker (row) against the others (columns), with the number of "X" columns of each row
+    # in a "score" column (a ticker in "X" against most of the universe is a relative strength leader).
+    tickers = list(data_dic) if (tickers is None) else list(tickers)
+    pairs = [(a, b) for a in tickers for b in tickers if (a != b)]
+    charts = rs_charts(data_dic, pairs, box_size=box_size, reversal_amount=reversal_amount,
+                       spread_trigger_wide=spread_trigger_wide)
+
+    position = {ticker: k for k, ticker in enumerate(tickers)}
+    cells = np.full((len(tickers), len(tickers)), "", dtype=object)
+    for (a, b), chart in charts.items():
+        cells[position[a], position[b]] = "X" if (chart.close_boxes[-1] >= chart.open_boxes[-1]) else "O"
+    table = pd.DataFrame(cells, index=pd.Index(tickers, name="ticker"), columns=tickers)
+    table["score"] = (cells == "X").sum(axis=1)
+    return charts, table
+
+
+def load_universe(ticker_list, start_date, end_date, store=None, concurrency=8):
+    # Loads the bars of all tickers once (from the local store, downloading what it does not cover):
+    from pnf_store import OhlcStore
+    from pnf_sources import load_tickers
+
+    store = OhlcStore() if (store is None) else store
+    return load_tickers(ticker_list, start_date, end_date, store=store, concurrency=concurrency)
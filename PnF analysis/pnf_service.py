@@ -0,0 +1,275 @@
+import os
+import io
+import sys
+import json
+import time
+import threading
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlsplit, parse_qs, unquote
+import pandas as pd
+from pnf_triggers import PnfAnalysis, BULLISH_NAMES, parse_parameters, trigger_lines, trigger_rows
+from pnf_batch import scan_tickers
+
+
+class ScannerService():
+    # Keeps the PnfAnalysis of every ticker in memory. New bars update the charts and the triggers incrementally
+    # (PnfAnalysis.update) and queries are answered from that state, without loading or scanning again.
+    # chart_params are passed to PnfAnalysis (start_date, end_date, reversal_amount, box_size, spread_trigger_wide,
+    # store, ...). All calls are thread safe.
+    def __init__(self, **chart_params):
+        self.chart_params = chart_params
+        self.pnf_obj_dic = {}
+        self.lock = threading.RLock()
+
+    def load(self, ticker_list, processes=None):
+        # Builds the charts and the triggers of the tickers (on a pool of processes, check pnf_batch.scan_tickers):
+        for ticker, pnf_obj, trigger_list in scan_tickers(ticker_list, processes=processes, get_data=False,
+                                                          **self.chart_params):
+            with self.lock:
+                self.pnf_obj_dic[ticker] = pnf_obj
+
+    def add_bars(self, ticker, bars):
+        # Adds new bars (DataFrame indexed by date with High, Low and Close columns) to the chart of ticker.
+        # Bars that are not after the last bar of the chart are ignored. An unknown ticker gets a new chart.
+        # Returns the number of columns of the chart, raises ValueError if the columns are missing.
+        missing = [col for col in ["High", "Low", "Close"] if (col not in bars.columns)]
+        if (missing != []):
+            raise ValueError("Missing columns in the bars of {}: {}".format(ticker, ", ".join(missing)))
+        # The bars are put in date order, on a repeated date the last one is kept:
+        bars = bars.sort_index(kind="stable")
+        bars = bars[~bars.index.duplicated(keep="last")]
+        with self.lock:
+            if (ticker in self.pnf_obj_dic):
+                self.pnf_obj_dic[ticker].update(bars)
+            else:
+                pnf_obj = PnfAnalysis(ticker, get_data=False, data=bars, **self.chart_params)
+                pnf_obj.check_triggers()
+                self.pnf_obj_dic[ticker] = pnf_obj
+            return len(self.pnf_obj_dic[ticker].pnf_data)
+
+    def last_date(self):
+        # Date of the last bar of all charts, the "last N days" of the queries end there:
+        with self.lock:
+            if (self.pnf_obj_dic == {}):
+                return None
+            return max(pnf_obj.data.index[-1] for pnf_obj in self.pnf_obj_dic.values())
+
+    def triggers(self, last_n_days=None, side=None, tickers=None):
+        # Triggers whose breakout column closed in the last_n_days days before last_date() (all triggers if None),
+        # as rows of pnf_triggers.trigger_rows. side is "bullish", "bearish" or None (both).
+        with self.lock:
+            start_date = None
+            if (last_n_days is not None) and (self.pnf_obj_dic != {}):
+                start_date = self.last_date() - pd.Timedelta(days=last_n_days)
+            rows = []
+            for ticker in (self.pnf_obj_dic if (tickers is None) else tickers):
+                pnf_obj = self.pnf_obj_dic[ticker]
+                trigger_list = pnf_obj.triggers_between(start_date, None)
+                if (side is not None):
+                    trigger_list = [trg for trg in trigger_list if ((trg[0] in BULLISH_NAMES) == (side == "bullish"))]
+                rows += trigger_rows(ticker, pnf_obj, trigger_list)
+            return rows
+
+    def columns(self, ticker):
+        # The columns of a chart, as rows with column, open, close, type and closing_date:
+        with self.lock:
+            pnf_data = self.pnf_obj_dic[ticker].pnf_data
+            closing_dates = self.pnf_obj_dic[ticker].closing_dates_list
+            return [{"column": column,
+                     "open": open_price,
+                     "close": close_price,
+                     "type": "O" if (open_price > close_price) else "X",
+                     "closing_date": str(closing_date.date())}
+                    for column, open_price, close_price, closing_date in zip(pnf_data.index.tolist(),
+                                                                             pnf_data.open.tolist(),
+                                                                             pnf_data.close.tolist(),
+                                                                             closing_dates)]
+
+    def chart(self, ticker, last_n_days=None):
+        # The chart of ticker as an image (bytes), with the lines of its triggers in the last_n_days days:
+        from pnf_render import render_chart
+
+        with self.lock:
+            pnf_obj = self.pnf_obj_dic[ticker]
+            start_date = None if (last_n_days is None) else self.last_date() - pd.Timedelta(days=last_n_days)
+            lines = trigger_lines(pnf_obj, pnf_obj.triggers_between(start_date, None))
+            opens = pnf_obj.pnf_data.open.to_numpy()
+            closes = pnf_obj.pnf_data.close.to_numpy()
+            columns = pnf_obj.pnf_data.index.to_numpy()
+            box_size = pnf_obj.box_size
+
+        # Drawing does not need the state any more, it runs outside the lock:
+        image = io.BytesIO()
+        render_chart(opens, closes, box_size, columns, image, chart_name=ticker, lines=lines)
+        return image.getvalue()
+
+    def status(self):
+        with self.lock:
+            return [{"ticker": ticker,
+                     "last_bar": str(pnf_obj.data.index[-1].date()),
+                     "columns": len(pnf_obj.pnf_data),
+                     "box_size": pnf_obj.box_size,
+                     "triggers": len(pnf_obj.trigger_list or [])}
+                    for ticker, pnf_obj in self.pnf_obj_dic.items()]
+
+    def read_drop_folder(self, directory):
+        # Feed from files: every <ticker>.csv or <ticker>@<anything>.csv in directory has new bars of ticker (first
+        # column is the date). Files are deleted once they are read. Write them under another name and rename them
+        # to .csv when they are complete. Returns the tickers that were updated.
+        updated = []
+        for file_name in sorted(os.listdir(directory)):
+            if (not file_name.endswith(".csv")):
+                continue
+            file_path = os.path.join(directory, file_name)
+            ticker = file_name[:-4].split("@")[0]
+            try:
+                bars = pd.read_csv(file_path, index_col=0, float_precision="round_trip")
+                bars.index = pd.to_datetime(bars.index)
+                self.add_bars(ticker, bars)
+                updated.append(ticker)
+            except Exception as e:
+                print("Could not read {}: {}".format(file_path, e))
+            os.remove(file_path)
+        return updated
+
+    def watch_drop_folder(self, directory, interval=1.0):
+        # Reads the drop folder every interval seconds in a daemon thread:
+        os.makedirs(directory, exist_ok=True)
+
+        def watch():
+            while (True):
+                self.read_drop_folder(directory)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=watch, daemon=True)
+        thread.start()
+        return thread
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    # Local API of the service (self.server.service):
+    #     GET  /status                                      tickers with their last bar, columns and triggers
+    #     GET  /triggers?days=N&side=bullish&ticker=T       trigger rows (json), every argument is optional
+    #     GET  /columns/<ticker>                            columns of the chart (json)
+    #     GET  /chart/<ticker>?days=N                       png chart with the trigger lines of the last N days
+    #     POST /bars/<ticker>                               csv body with new bars (same format as the drop files)
+    def do_GET(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = [unquote(part) for part in url.path.strip("/").split("/")]
+        try:
+            days = int(query["days"][0]) if ("days" in query) else None
+            side = query["side"][0] if ("side" in query) else None
+            if (days is not None) and (days < 0):
+                raise ValueError("days must be 0 or more")
+            if (side not in [None, "bullish", "bearish"]):
+                raise ValueError("side must be bullish or bearish")
+        except ValueError as e:
+            self.send_json({"error": "bad query: {}".format(e)}, 400)
+            return
+
+        try:
+            if (path == ["status"]):
+                self.send_json(service.status())
+            elif (path == ["triggers"]):
+                self.send_json(service.triggers(last_n_days=days, side=side, tickers=query.get("ticker")))
+            elif (len(path) == 2) and (path[0] == "columns"):
+                self.send_json(service.columns(path[1]))
+            elif (len(path) == 2) and (path[0] == "chart"):
+                self.send_body(service.chart(path[1], last_n_days=days), "image/png")
+            else:
+                self.send_json({"error": "unknown path {}".format(url.path)}, 404)
+        except KeyError as e:
+            self.send_json({"error": "unknown ticker {}".format(e)}, 404)
+
+    def do_POST(self):
+        service = self.server.service
+        path = [unquote(part) for part in urlsplit(self.path).path.strip("/").split("/")]
+        if (len(path) != 2) or (path[0] != "bars"):
+            self.send_json({"error": "unknown path {}".format(self.path)}, 404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            bars = pd.read_csv(io.BytesIO(body), index_col=0, float_precision="round_trip")
+            bars.index = pd.to_datetime(bars.index)
+            self.send_json({"ticker": path[1], "columns": service.add_bars(path[1], bars)})
+        except Exception as e:
+            self.send_json({"error": str(e)}, 400)
+
+    def send_json(self, value, status=200):
+        self.send_body(json.dumps(value).encode(), "application/json", status)
+
+    def send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # No log line per request:
+        pass
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    # Same API on a Unix socket (e.g. curl --unix-socket <path> http://localhost/status):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) client address:
+        request, client_address = super().get_request()
+        return request, ("local", 0)
+
+
+def serve(service, port=8765, unix_socket=None):
+    # Answers the queries until the process is stopped:
+    if (unix_socket is not None):
+        if (os.path.exists(unix_socket)):
+            os.remove(unix_socket)
+        server = UnixHTTPServer(unix_socket, ServiceRequestHandler)
+    else:
+        server = ThreadingHTTPServer(("127.0.0.1", port), ServiceRequestHandler)
+    server.service = service
+    server.serve_forever()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Keeps the point and figure charts in memory and answers queries.")
+    parser.add_argument("--start-date", default="", help="yyyy-mm-dd, default 2021-01-01")
+    parser.add_argument("--reversal-amount", default="", help="float, default 3")
+    parser.add_argument("--box-size", default="", help="float, default depends on the last price")
+    parser.add_argument("--spread-trigger-wide", default="", help="int, default 15")
+    parser.add_argument("--processes", default="", help="int, default all cores")
+    parser.add_argument("--tickers", default="tickers.txt", help="file with the tickers separated by spaces")
+    parser.add_argument("--data-dir", default=None, help="read the bars from <ticker>.csv / <ticker>.parquet files here")
+    parser.add_argument("--feed-dir", default="feed", help="folder where new bars are dropped as <ticker>.csv")
+    parser.add_argument("--poll-interval", default=1.0, type=float, help="seconds between two reads of the feed folder")
+    parser.add_argument("--port", default=8765, type=int)
+    parser.add_argument("--unix-socket", default=None, help="listen on this Unix socket instead of the port")
+    args = parser.parse_args(argv)
+
+    params = parse_parameters([args.start_date, "", args.reversal_amount, args.box_size, "",
+                               args.spread_trigger_wide, "no", args.processes])
+    chart_params = {key: params[key] for key in ["start_date", "end_date", "reversal_amount", "box_size",
+                                                 "spread_trigger_wide"]}
+    if (args.data_dir is not None):
+        from pnf_store import OhlcStore
+        from pnf_sources import LocalFilesProvider
+        chart_params["store"] = OhlcStore(os.path.join(args.data_dir, "store"),
+                                          provider=LocalFilesProvider(args.data_dir))
+
+    with open(args.tickers, "r") as txt_file:
+        ticker_list = txt_file.read().split()
+
+    service = ScannerService(**chart_params)
+    service.load(ticker_list, processes=params["processes"])
+    service.watch_drop_folder(args.feed_dir, args.poll_interval)
+    print("{} charts loaded, serving on {}".format(len(service.pnf_obj_dic), args.unix_socket or args.port))
+    serve(service, port=args.port, unix_socket=args.unix_socket)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from pnf_metrics import NULL_METRICS
+
+
+class NotInStoreError(LookupError):
+    # A ticker is read from the local store without downloading (download=False) and the store does not have it:
+    pass
+
+
+# Errors that do not go away by trying again: no file for the ticker (LocalFilesProvider) or no ticker in the store.
+# Everything else is retried, parsing errors (ValueError, KeyError, ...) usually come from a throttled or empty
+# reply of the data provider.
+PERMANENT_ERRORS = (FileNotFoundError, NotInStoreError)
+
+
+class DataProvider():
+    # Source of OHLC bars. A provider implements download(ticker, start_date, end_date), a blocking call that
+    # returns a DataFrame indexed by Date with (at least) Open, High, Low, Close columns, end_date included.
+    # fetch is the async version, by default it runs download in a thread. Providers that have an async client can
+    # override fetch instead.
+    def download(self, ticker, start_date, end_date):
+        raise NotImplementedError
+
+    async def fetch(self, ticker, start_date, end_date):
+        return await asyncio.to_thread(self.download, ticker, start_date, end_date)
+
+
+class YFinanceProvider(DataProvider):
+    # Daily bars from Yahoo Finance. Ticker.history is used instead of yf.download, yf.download keeps its results
+    # in module level state and can not run in several threads at the same time.
+    def download(self, ticker, start_date, end_date):
+        import yfinance as yf
+
+        # end_date is included, yfinance excludes the end so one day is added:
+        end_date_for_yf = to_date(end_date) + dt.timedelta(days=1)
+        df = yf.Ticker(ticker).history(start=str(to_date(start_date)), end=str(end_date_for_yf), auto_adjust=False)
+        df = df.drop(columns=["Dividends", "Stock Splits", "Capital Gains"], errors="ignore")
+        return normalize_ohlc(df)
+
+
+class LocalFilesProvider(DataProvider):
+    # Bars from files in a folder, one file per ticker: <ticker>.parquet or <ticker>.csv (first column is the date).
+    # For offline runs and tests, e.g. with the csv files saved in downloaded_data.
+    def __init__(self, directory, sep=","):
+        self.directory = directory
+        self.sep = sep
+
+    def download(self, ticker, start_date, end_date):
+        parquet_path = os.path.join(self.directory, ticker + ".parquet")
+        csv_path = os.path.join(self.directory, ticker + ".csv")
+        if (os.path.exists(parquet_path)):
+            df = pd.read_parquet(parquet_path)
+            if ("Date" in df.columns):
+                df = df.set_index("Date")
+        elif (os.path.exists(csv_path)):
+            df = pd.read_csv(csv_path, sep=self.sep, index_col=0, float_precision="round_trip")
+        else:
+            raise FileNotFoundError("No {}.parquet or {}.csv in {}".format(ticker, ticker, self.directory))
+
+        df.index = pd.to_datetime(df.index)
+        df = normalize_ohlc(df).sort_index(kind="stable")
+        return df[pd.Timestamp(to_date(start_date)):pd.Timestamp(to_date(end_date))]
+
+
+def normalize_ohlc(df):
+    # Single level columns, tz-naive index named "Date":
+    if (isinstance(df.columns, pd.MultiIndex)):
+        df.columns = df.columns.get_level_values(0)
+    if (df.index.tz is not None):
+        df.index = df.index.tz_localize(None)
+    df.index.name = "Date"
+    return df
+
+
+async def fetch_many(ticker_list, start_date, end_date, store=None, provider=None, concurrency=8, retries=3,
+                     backoff=1.0, metrics=None):
+    # Fetches the bars of all tickers concurrently, at most `concurrency` tickers at a time.
+    # With a store (OhlcStore) the bars go through store.load_async, so only the dates it does not cover are fetched
+    # (with fetch of the provider of the store). Otherwise they come from provider (YFinanceProvider by default).
+    # A failed ticker is tried `retries` more times, waiting backoff, 2 * backoff, 4 * backoff, ... seconds
+    # (not for PERMANENT_ERRORS).
+    # Returns {ticker: DataFrame}, tickers that still fail are reported and skipped.
+    # The "download" stage of each ticker (retries included) is recorded in metrics (pnf_metrics.ScanMetrics).
+    if (store is None) and (provider is None):
+        provider = YFinanceProvider()
+    metrics = NULL_METRICS if (metrics is None) else metrics
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(ticker):
+        async with semaphore:
+            with metrics.stage(ticker, "download") as counts:
+                for attempt in range(retries + 1):
+                    try:
+                        if (store is not None):
+                            df = await store.load_async(ticker, start_date, end_date)
+                        else:
+                            df = await provider.fetch(ticker, start_date, end_date)
+                        counts["bars"] = len(df)
+                        return ticker, df
+                    except Exception as e:
+                        # Missing files and tickers that are not in the store fail the same way again, they are not retried:
+                        if (attempt == retries) or (isinstance(e, PERMANENT_ERRORS)):
+                            print("Could not load {}: {}".format(ticker, e))
+                            return ticker, None
+                        await asyncio.sleep(backoff * 2 ** attempt)
+
+    results = await asyncio.gather(*[fetch_one(ticker) for ticker in ticker_list])
+    return {ticker: df for ticker, df in results if (df is not None)}
+
+
+def load_tickers(ticker_list, start_date, end_date, store=None, provider=None, concurrency=8, retries=3,
+                 backoff=1.0, metrics=None):
+    # Blocking version of fetch_many (for scripts), blocking downloads run on `concurrency` threads:
+    async def run():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        return await fetch_many(ticker_list, start_date, end_date, store=store, provider=provider,
+                                concurrency=concurrency, retries=retries, backoff=backoff, metrics=metrics)
+
+    return asyncio.run(run())
+
+
+def to_date(date):
+    # Accepts "yyyy-mm-dd" strings, dates and timestamps:
+    return pd.Timestamp(date).date()
@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import datetime as dt
+import numpy as np
+import pandas as pd
+from pnf_sources import YFinanceProvider, NotInStoreError, to_date
+
+
+class OhlcStore():
+    # Local price store. Every ticker has its own folder with one .npy file per column (Date, Open, High, ...),
+    # so the columns can be memory-mapped and a date range is served with a binary search on the Date column.
+    # meta.json keeps the dates of the first and last stored bars (covered_from, covered_until), the date range that
+    # was already asked to the data provider (requested_from, requested_until) and the time of the last fetch:
+    #     {"columns": [...], "covered_from": "yyyy-mm-dd", "covered_until": "yyyy-mm-dd",
+    #      "requested_from": "yyyy-mm-dd", "requested_until": "yyyy-mm-dd", "fetched_at": "yyyy-mm-ddThh:mm:ss"}
+    # The bars are fetched with provider (pnf_sources, Yahoo Finance by default), with provider.fetch in load_async.
+    # The dates after the last bar are asked again when the last fetch is older than refresh_after seconds (check
+    # missing_ranges).
+    def __init__(self, directory="downloaded_data/store", provider=None, refresh_after=12 * 3600):
+        self.directory = directory
+        self.provider = YFinanceProvider() if (provider is None) else provider
+        self.refresh_after = refresh_after
+
+    def ticker_directory(self, ticker):
+        return os.path.join(self.directory, ticker.replace(os.sep, "_"))
+
+    def read_meta(self, ticker):
+        meta_path = os.path.join(self.ticker_directory(ticker), "meta.json")
+        if (not os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r") as f:
+            return json.load(f)
+
+    def read(self, ticker, mmap_mode="r"):
+        # Returns the stored columns as a dictionary of (memory-mapped) arrays, None if the ticker is not stored:
+        meta = self.read_meta(ticker)
+        if (meta is None):
+            return None
+        folder = self.ticker_directory(ticker)
+        arrays = {"Date": np.load(os.path.join(folder, "Date.npy"), mmap_mode=mmap_mode)}
+        for col in meta["columns"]:
+            arrays[col] = np.load(os.path.join(folder, col + ".npy"), mmap_mode=mmap_mode)
+        return arrays
+
+    def write(self, ticker, df, requested_from, requested_until, bars_changed=True):
+        # Saves the bars of df (with bars_changed=False only the meta is written, the stored bars are df already):
+        folder = self.ticker_directory(ticker)
+        os.makedirs(folder, exist_ok=True)
+        columns = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+
+        # Write to temporary files first and then replace, so a reader never sees half written columns:
+        if (bars_changed):
+            arrays = {"Date": df.index.values.astype("datetime64[ns]")}
+            for col in columns:
+                arrays[col] = df[col].to_numpy()
+            for name, arr in arrays.items():
+                with open(os.path.join(folder, name + ".npy.tmp"), "wb") as f:
+                    np.save(f, arr)
+                os.replace(os.path.join(folder, name + ".npy.tmp"), os.path.join(folder, name + ".npy"))
+
+        meta = {"columns": columns, "covered_from": str(df.index[0].date()), "covered_until": str(df.index[-1].date()),
+                "requested_from": str(requested_from), "requested_until": str(requested_until),
+                "fetched_at": dt.datetime.now().isoformat(timespec="seconds")}
+        with open(os.path.join(folder, "meta.json.tmp"), "w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(folder, "meta.json.tmp"), os.path.join(folder, "meta.json"))
+
+    def to_frame(self, arrays, start_date=None, end_date=None):
+        # Slices the stored arrays between start_date and end_date (both included):
+        dates = arrays["Date"]
+        first = 0 if (start_date is None) else np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), "left")
+        last = len(dates) if (end_date is None) else np.searchsorted(dates, np.datetime64(pd.Timestamp(end_date)), "right")
+        df = pd.DataFrame({col: np.array(arr[first:last]) for col, arr in arrays.items() if col != "Date"},
+                          index=pd.DatetimeIndex(np.array(dates[first:last]), name="Date"))
+        return df
+
+    def download(self, ticker, start_date, end_date):
+        # end_date is included:
+        return self.provider.download(ticker, start_date, end_date)
+
+    def load(self, ticker, start_date, end_date, download=True):
+        # Returns the bars between start_date and end_date. Only the dates that the store does not cover yet are
+        # fetched (check missing_ranges).
+        start = to_date(start_date)
+        end = min(to_date(end_date), dt.date.today())
+        ranges = self.missing_ranges(ticker, start, end, download)
+        if (ranges != []):
+            self.add_bars(ticker, ranges, [self.download(ticker, first, last) for first, last in ranges])
+        return self.to_frame(self.read(ticker), start, end)
+
+    async def load_async(self, ticker, start_date, end_date, download=True):
+        # load for asyncio code: the missing dates are fetched with provider.fetch (the async client of the provider
+        # if it has one), the files are read and written in a thread.
+        start = to_date(start_date)
+        end = min(to_date(end_date), dt.date.today())
+        ranges = await asyncio.to_thread(self.missing_ranges, ticker, start, end, download)
+        if (ranges != []):
+            parts = [await self.provider.fetch(ticker, first, last) for first, last in ranges]
+            await asyncio.to_thread(self.add_bars, ticker, ranges, parts)
+        return await asyncio.to_thread(self.load, ticker, start, end, False)
+
+    def missing_ranges(self, ticker, start, end, download=True):
+        # [(first date, last date), ...] that have to be fetched so the store covers start to end (dates):
+        #     - the dates before requested_from and after requested_until, they were never asked.
+        #     - the dates from the last bar on, if the last fetch is older than refresh_after seconds and either
+        #       some of them were asked without getting a bar (weekends, holidays, a short reply of the provider) or
+        #       the last bar was fetched on its own day (it may be incomplete).
+        # So a run with up to date data in the store does not fetch anything.
+        meta = self.read_meta(ticker)
+        if (meta is None):
+            if (not download):
+                raise NotInStoreError("{} is not in the local store {}".format(ticker, self.directory))
+            return [(start, end)]
+        if (not download):
+            return []
+
+        covered_from = to_date(meta["covered_from"])
+        covered_until = to_date(meta["covered_until"])
+        # Stores written before the requested dates and fetched_at were kept have the covered dates only:
+        requested_from = to_date(meta.get("requested_from", meta["covered_from"]))
+        requested_until = to_date(meta.get("requested_until", meta["covered_until"]))
+        fetched_at = pd.Timestamp(meta.get("fetched_at", meta.get("fetched_on", meta["covered_until"])))
+        stale = (pd.Timestamp.now() - fetched_at).total_seconds() > self.refresh_after
+
+        ranges = []
+        if (start < requested_from):
+            ranges.append((start, covered_from - dt.timedelta(days=1)))
+        if (end > requested_until):
+            ranges.append((covered_until, end))
+        elif (stale) and ((end > covered_until) or ((end == covered_until) and (fetched_at.date() <= covered_until))):
+            ranges.append((covered_until, end))
+        return ranges
+
+    def add_bars(self, ticker, ranges, parts):
+        # Saves the bars fetched for the ranges of missing_ranges (parts[k] has the bars of ranges[k]). The covered
+        # dates are the ones of the bars the provider returned. Nothing but the meta is written when the fetched
+        # bars are already stored.
+        parts = [part for part in parts if (len(part) > 0)]
+        requested_from = min(first for first, last in ranges)
+        requested_until = max(last for first, last in ranges)
+        meta = self.read_meta(ticker)
+        if (meta is None):
+            # A failed fetch is not saved as an empty store (the provider may return no bars instead of an error):
+            if (parts == []):
+                raise ValueError("No bars for {} from {} to {}".format(ticker, requested_from, requested_until))
+            df = pd.concat(parts).sort_index(kind="stable")
+            self.write(ticker, df[~df.index.duplicated(keep="last")], requested_from, requested_until)
+            return
+
+        requested_from = min(requested_from, to_date(meta.get("requested_from", meta["covered_from"])))
+        requested_until = max(requested_until, to_date(meta.get("requested_until", meta["covered_until"])))
+        stored = self.to_frame(self.read(ticker, mmap_mode=None))
+        # Newly fetched bars replace the stored ones on the same date:
+        df = pd.concat([stored] + parts).sort_index(kind="stable")
+        df = df[~df.index.duplicated(keep="last")]
+        # Only the numeric columns are stored, so only they are compared:
+        df = df[[col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]]
+        self.write(ticker, df, requested_from, requested_until, bars_changed=not df.equals(stored))
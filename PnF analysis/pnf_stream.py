@@ -0,0 +1,149 @@
+from itertools import islice
+import numpy as np
+from pnf_triggers import first_pnf_streak
+
+
+def extend_pnf_columns_blocks(high, low, start, current_streak, pnf_open, pnf_close, box_size, reversal_amount,
+                              block_size=64):
+    # Same result as pnf_triggers.extend_pnf_columns, for long series with few reversals (ticks, sub-minute bars).
+    # Instead of a python step per bar, the running close of a streak is found for a block of bars at once
+    # (np.fmax.accumulate for "X", np.fmin.accumulate for "O") and the first reversal in the block with argmax.
+    # The block grows while there is no reversal and shrinks back after one, so the work stays proportional to
+    # the number of bars.
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    n = len(high)
+    reversal_range = (reversal_amount + 1) * box_size
+    opens = []
+    closes = []
+    positions = []
+
+    j = start
+    block = block_size
+    while (j < n):
+        end = min(j + block, n)
+        if (current_streak == "X"):
+            running_close = np.fmax(np.fmax.accumulate(high[j:end]), pnf_close)
+            reversal = low[j:end] < running_close - reversal_range
+        else:
+            running_close = np.fmin(np.fmin.accumulate(low[j:end]), pnf_close)
+            reversal = high[j:end] > running_close + reversal_range
+
+        k = int(np.argmax(reversal))
+        if (not reversal[k]):
+            # No reversal in the block, the streak goes on with a bigger block:
+            pnf_close = float(running_close[-1])
+            j = end
+            block = min(block * 2, 1 << 16)
+            continue
+
+        opens.append(pnf_open)
+        closes.append(float(running_close[k]))
+        positions.append(j + k)
+        if (current_streak == "X"):
+            current_streak = "O"
+            pnf_open = running_close[k] - box_size
+            pnf_close = float(low[j + k])
+        else:
+            current_streak = "X"
+            pnf_open = running_close[k] + box_size
+            pnf_close = float(high[j + k])
+        pnf_open = float(pnf_open)
+        j = j + k + 1
+        block = max(block_size, 2 * (k + 1))
+
+    return (np.array(opens, dtype=float), np.array(closes, dtype=float), np.array(positions, dtype=np.int64),
+            current_streak, pnf_open, pnf_close)
+
+
+def tick_chunks(ticks, chunk_size=65536):
+    # Groups an iterator of single prices (e.g. a generator reading a tick file) into numpy arrays for
+    # PnfStream.stream. A column is only reported once the chunk with its closing tick is full, use a smaller
+    # chunk_size for a live feed.
+    ticks = iter(ticks)
+    while (True):
+        chunk = np.fromiter(islice(ticks, chunk_size), dtype=float)
+        if (len(chunk) == 0):
+            return
+        yield chunk
+
+
+class PnfStream():
+    # Builds a chart from a stream of ticks or bars in bounded memory. Data is pushed in chunks (numpy arrays) and
+    # every push returns the columns closed by that chunk as (opens, closes, closing_dates), on the box grid like
+    # PnfAnalysis.pnf_data. Closed columns are not kept. The column in progress is in current_column().
+    # The columns are the same as PnfAnalysis / pnf_columns on the whole series. The first streak needs the bars
+    # until the price moves (reversal_amount + 1) boxes, only those bars are buffered.
+    def __init__(self, box_size, reversal_amount=3, block_size=64):
+        self.box_size = box_size
+        self.reversal_amount = reversal_amount
+        self.block_size = block_size
+        self.n_bars = 0
+        self.n_columns = 0
+        self.first_streak_complete = False
+        self.buffer = []  # (high, low, dates) chunks until the first streak is decided, None after
+        self.current_streak = None
+        self.pnf_open = None
+        self.pnf_close = None
+        self.last_date = None
+
+    def push_ticks(self, prices, dates=None):
+        # Ticks are bars with High = Low = price:
+        prices = np.asarray(prices, dtype=float)
+        return self.push(prices, prices, dates)
+
+    def push(self, high, low, dates=None):
+        # dates are the bar dates (any numpy array, e.g. datetime64 or int64), the bar numbers are used without them.
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        if (dates is None):
+            dates = np.arange(self.n_bars, self.n_bars + len(high))
+        dates = np.asarray(dates)
+        if (len(high) == 0):
+            return self.rounded(np.empty(0), np.empty(0)) + (dates[:0],)
+        self.n_bars += len(high)
+        self.last_date = dates[-1]
+
+        if (self.buffer is not None):
+            # Decide the first streak on all buffered bars, then walk them from the second bar on (as pnf_columns):
+            self.buffer.append((high, low, dates))
+            high = np.concatenate([chunk[0] for chunk in self.buffer])
+            low = np.concatenate([chunk[1] for chunk in self.buffer])
+            dates = np.concatenate([chunk[2] for chunk in self.buffer])
+            streak = first_pnf_streak(high, low, self.box_size, self.reversal_amount)
+            self.current_streak, self.pnf_open, self.pnf_close, self.first_streak_complete = streak
+            # A nan first bar stops first_pnf_streak at once (the streak is kept, but not "complete"):
+            if (not self.first_streak_complete) and (not np.isnan(high[0] - low[0])):
+                return self.rounded(np.empty(0), np.empty(0)) + (dates[:0],)
+            self.buffer = None
+            start = 1
+        else:
+            start = 0
+
+        opens, closes, positions, self.current_streak, self.pnf_open, self.pnf_close = extend_pnf_columns_blocks(
+            high, low, start, self.current_streak, self.pnf_open, self.pnf_close, self.box_size,
+            self.reversal_amount, block_size=self.block_size)
+        self.n_columns += len(closes)
+
+        return self.rounded(opens, closes) + (dates[positions],)
+
+    def stream(self, chunks, ticks=True):
+        # Generator over an iterable of chunks: price arrays (ticks=True) or (high, low) / (high, low, dates) tuples.
+        # Yields (opens, closes, closing_dates) for the chunks that close at least one column.
+        for chunk in chunks:
+            if (ticks):
+                columns = self.push_ticks(*chunk) if isinstance(chunk, tuple) else self.push_ticks(chunk)
+            else:
+                columns = self.push(*chunk)
+            if (len(columns[1]) > 0):
+                yield columns
+
+    def current_column(self):
+        # (open, close, streak) of the column in progress on the box grid, None before the first bar:
+        if (self.current_streak is None):
+            return None
+        opens, closes = self.rounded(np.array([self.pnf_open]), np.array([self.pnf_close]))
+        return float(opens[0]), float(closes[0]), self.current_streak
+
+    def rounded(self, opens, closes):
+        return self.box_size * np.round(opens / self.box_size), self.box_size * np.round(closes / self.box_size)
@@ -0,0 +1,119 @@
+import os
+import datetime as dt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from pnf_store import OhlcStore
+from pnf_triggers import (first_pnf_streak, extend_pnf_columns, find_triggers, remove_duplicate_triggers,
+                          trigger_levels, BULLISH_NAMES)
+
+SUMMARY_COLUMNS = ["ticker", "box_size", "reversal_amount", "columns", "bullish_triggers", "bearish_triggers",
+                   "last_trigger"]
+TRIGGER_COLUMNS = ["ticker", "box_size", "reversal_amount", "pattern", "side", "column", "width", "price_level",
+                   "trigger_date"]
+
+
+def sweep_parameters(data, box_sizes, reversal_amounts, spread_trigger_wide=15, ticker=None):
+    # Builds the chart and the triggers of every (box_size, reversal_amount) pair from one OHLC DataFrame.
+    # The columns only depend on (reversal_amount + 1) * box_size (the reversal range), so the bars are walked once
+    # for each distinct reversal range. The opens (one box away from the previous close), the rounding to the box
+    # grid and the triggers are then computed for each pair with array operations.
+    # Returns two tidy tables:
+    #     summary:  one row per pair (box_size, reversal_amount, columns, bullish_triggers, bearish_triggers, ...)
+    #     triggers: one row per trigger (box_size, reversal_amount, pattern, side, column, width, price_level, ...)
+    high = data.High.to_numpy(dtype=float)
+    low = data.Low.to_numpy(dtype=float)
+
+    # Group the pairs by their reversal range:
+    groups = {}
+    for box_size in box_sizes:
+        for reversal_amount in reversal_amounts:
+            groups.setdefault((reversal_amount + 1) * box_size, []).append((box_size, reversal_amount))
+
+    summary_rows = []
+    trigger_tables = []
+    for pairs in groups.values():
+        box_size, reversal_amount = pairs[0]
+        current_streak, pnf_open, pnf_close, first_streak_complete = first_pnf_streak(high, low, box_size,
+                                                                                      reversal_amount)
+        first_open = pnf_open
+        opens, closes, positions, current_streak, pnf_open, pnf_close = extend_pnf_columns(
+            high, low, 1, current_streak, pnf_open, pnf_close, box_size, reversal_amount)
+        closes = np.append(closes, pnf_close)
+        positions = np.append(positions, len(high) - 1)
+        closing_dates = data.index[positions]
+
+        # Columns alternate, the first one is "X" if its close is above its open:
+        first_is_x = (closes[0] > first_open)
+        raw_is_x = (np.arange(len(closes)) % 2 == 0) == first_is_x
+
+        for box_size, reversal_amount in pairs:
+            # Every column after the first one opens one box away from the close of the previous column:
+            opens = np.empty(len(closes))
+            opens[0] = first_open
+            opens[1:] = np.where(raw_is_x[1:], closes[:-1] + box_size, closes[:-1] - box_size)
+            rounded_opens = box_size * np.round(opens / box_size)
+            rounded_closes = box_size * np.round(closes / box_size)
+
+            trigger_list = remove_duplicate_triggers(find_triggers(rounded_closes, ~(rounded_opens > rounded_closes),
+                                                                   spread_trigger_wide=spread_trigger_wide))
+            n_bullish = sum(1 for trg in trigger_list if trg[0] in BULLISH_NAMES)
+            last_trigger = trigger_list[-1][0] if (trigger_list != []) else None
+            summary_rows.append({"ticker": ticker,
+                                 "box_size": box_size,
+                                 "reversal_amount": reversal_amount,
+                                 "columns": len(closes),
+                                 "bullish_triggers": n_bullish,
+                                 "bearish_triggers": len(trigger_list) - n_bullish,
+                                 "last_trigger": last_trigger})
+            names = [trg[0] for trg in trigger_list]
+            columns = np.array([trg[1] for trg in trigger_list], dtype=np.int64)
+            widths = np.array([trg[2] for trg in trigger_list], dtype=np.int64)
+            bullish = np.isin(names, BULLISH_NAMES)
+            trigger_tables.append(pd.DataFrame({"ticker": ticker,
+                                                "box_size": box_size,
+                                                "reversal_amount": reversal_amount,
+                                                "pattern": names,
+                                                "side": np.where(bullish, "bullish", "bearish"),
+                                                "column": columns,
+                                                "width": widths,
+                                                "price_level": trigger_levels(rounded_closes, columns, widths, bullish),
+                                                "trigger_date": closing_dates[columns + widths - 1]},
+                                               columns=TRIGGER_COLUMNS))
+
+    summary = pd.DataFrame(summary_rows, columns=SUMMARY_COLUMNS)
+    triggers = pd.DataFrame(columns=TRIGGER_COLUMNS)
+    if (trigger_tables != []):
+        triggers = pd.concat(trigger_tables, ignore_index=True)
+    return summary.sort_values(["box_size", "reversal_amount"], ignore_index=True), triggers
+
+
+def sweep_ticker(ticker, box_sizes, reversal_amounts, spread_trigger_wide=15, start_date="2021-01-01",
+                 end_date=None, store=None):
+    # Loads the data of one ticker once (from the local store) and sweeps it (runs in a worker process):
+    store = OhlcStore() if (store is None) else store
+    data = store.load(ticker, start_date, dt.date.today() if (end_date is None) else end_date)
+    return sweep_parameters(data, box_sizes, reversal_amounts, spread_trigger_wide=spread_trigger_wide,
+                            ticker=ticker)
+
+
+def sweep_tickers(ticker_list, box_sizes, reversal_amounts, processes=None, **params):
+    # Runs sweep_ticker for every ticker on a pool of processes and returns the (summary, triggers) tables of all
+    # tickers. params are passed to sweep_ticker (spread_trigger_wide, start_date, end_date, store).
+    summaries = []
+    triggers = []
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        futures = {executor.submit(sweep_ticker, ticker, box_sizes, reversal_amounts, **params): ticker
+                   for ticker in ticker_list}
+        for future in as_completed(futures):
+            try:
+                summary, trigger_table = future.result()
+            except Exception as e:
+                print("Could not sweep {}: {}".format(futures[future], e))
+                continue
+            summaries.append(summary)
+            triggers.append(trigger_table)
+
+    if (summaries == []):
+        return pd.DataFrame(columns=SUMMARY_COLUMNS), pd.DataFrame(columns=TRIGGER_COLUMNS)
+    return pd.concat(summaries, ignore_index=True), pd.concat(triggers, ignore_index=True)
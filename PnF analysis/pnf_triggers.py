@@ -1,18 +1,16 @@
 import pandas as pd
 import numpy as np
 import datetime as dt
-import matplotlib.pyplot as plt
-from matplotlib.ticker import (AutoMinorLocator)
-import warnings
-import seaborn as sns
-import yfinance as yf
 import sys
-warnings.filterwarnings("ignore")
-import easygui
-import locale
+import os
+import bisect
+from pnf_store import OhlcStore
+from pnf_metrics import NULL_METRICS
+# matplotlib, easygui and yfinance are imported when they are first used, so the charts and the triggers can be
+# computed without them (worker processes, servers without a display).
 
 class PnfAnalysis():
-    def __init__(self, ticker, start_date="2021-01-01", end_date=dt.date.today(), reversal_amount=3, box_size=None, last_n_days=None, spread_trigger_wide=15, get_data=True):
+    def __init__(self, ticker, start_date="2021-01-01", end_date=dt.date.today(), reversal_amount=3, box_size=None, last_n_days=None, spread_trigger_wide=15, get_data=True, store=None, data=None, metrics=None, cache=None, download=True):
         self.ticker = ticker
         self.start_date = start_date
         self.end_date = end_date
@@ -20,17 +18,69 @@ class PnfAnalysis():
         self.box_size = box_size
         self.last_n_days = last_n_days
         self.get_data = get_data
-
-        data = self.import_data()
+        # With download=False the bars are only read from the store (e.g. after pnf_sources.load_tickers filled it):
+        self.download = download
+        self.raw_trigger_list = None
+        self.trigger_list = None
+        self.window_index = None
+        self.dedupe_state = None
+        self.store = OhlcStore() if (store is None) else store
+        # Stage timings and counts go to metrics (a pnf_metrics.ScanMetrics), they are not recorded without it:
+        self.metrics = NULL_METRICS if (metrics is None) else metrics
+        # Results of create_pnf_data and check_triggers are reused from cache (a pnf_cache.ResultCache) if given:
+        self.cache = cache
+        self.data_hash = None
+
+        # data can be given directly (a DataFrame with High, Low and Close columns indexed by date):
+        if (data is None):
+            with self.metrics.stage(ticker, "import_data") as counts:
+                data = self.import_data()
+                counts["bars"] = len(data)
         self.data = data
-        self.pnf_data = self.create_pnf_data(data=data)
+        with self.metrics.stage(ticker, "create_pnf_data") as counts:
+            self.create_pnf_data(data=data)
+            counts["bars"] = len(data)
+            counts["columns"] = self.n_columns
         self.spread_trigger_wide = spread_trigger_wide
 
+    def __getstate__(self):
+        # The frames are built again from the arrays after unpickling, they are not sent twice:
+        state = self.__dict__.copy()
+        state["data_frame"] = self.data
+        state["pending_bars"] = []
+        state["pnf_frame"] = None
+        return state
+
+    @property
+    def data(self):
+        # The bars of the chart. update() keeps the new bars aside, they are added to the frame when it is used:
+        if (self.pending_bars != []):
+            self.data_frame = pd.concat([self.data_frame] + self.pending_bars)
+            self.pending_bars = []
+        return self.data_frame
+
+    @data.setter
+    def data(self, data):
+        self.data_frame = data
+        self.pending_bars = []
+
+    @property
+    def pnf_data(self):
+        # The columns on the box grid (open, close) numbered from 1, built from the column arrays when first used:
+        if (self.pnf_frame is None):
+            self.pnf_frame = pd.DataFrame({"open": self.column_opens[:self.n_columns],
+                                           "close": self.column_closes[:self.n_columns]},
+                                          index=pd.RangeIndex(1, self.n_columns + 1, name="rownbr"), copy=True)
+        return self.pnf_frame
+
     def import_data(self):
-        end_date_for_yf = dt.datetime.strptime(end_date, "%Y-%m-%d").date() + dt.timedelta(days=1)
-        df = yf.download(self.ticker, start=self.start_date, end=end_date_for_yf)
+        # Bars are served from the local store, only the dates it does not cover yet are downloaded (nothing is
+        # downloaded with download=False):
+        df = self.store.load(self.ticker, self.start_date, self.end_date, download=self.download)
         file_path = "downloaded_data/{}_from_{}_to_{}.csv".format(self.ticker, self.start_date, self.end_date).replace("-", "_")
         if (self.get_data):
+            # The store can live in another folder (e.g. --data-dir), so downloaded_data may not exist yet:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
             df.to_csv(file_path, sep=";")
         return df
 
@@ -38,220 +88,490 @@ class PnfAnalysis():
 
         if (self.box_size == None):
             # First, determine the box size according to the last closing price if it is not specified:
-            last_price = data.Close[len(data) - 1]
-            self.box_size = 0.05
-            if (last_price > 1):
-                self.box_size = 0.10
-            if (last_price > 2):
-                self.box_size = 0.25
-            if (last_price > 5):
-                self.box_size = 0.5
-            if (last_price > 20):
-                self.box_size = 1
-            if (last_price > 100):
-                self.box_size = 2
-            if (last_price > 200):
-                self.box_size = 4
-
-            # Second: Initialize the first streak
-        lowest_price = data.iloc[0, ].Low
-        highest_price = data.iloc[0, ].High
-        diff = highest_price - lowest_price
-        i = 1
-        while (diff < (self.reversal_amount + 1) * self.box_size) and (i < len(data)):
-            lowest_price = min(lowest_price, data.iloc[i, ].Low)
-            highest_price = max(highest_price, data.iloc[i, ].High)
-            diff = highest_price - lowest_price
-            i += 1
-
-        pnf_data = pd.DataFrame(columns=["open", "close"])
-
-        if ((highest_price - data.iloc[0, ].Low) > (data.iloc[0, ].High - lowest_price)):
-            # If highest price is increased more than lowest price decreased --> first streak is "X". Otherwise "O"
-            current_streak = "X"
-            pnf_open = data.iloc[0, ].Low
-            pnf_close = highest_price
-            pnf_data.loc[0, "open"] = pnf_open
-            pnf_data.loc[0, "close"] = pnf_close
-
+            self.box_size = default_box_size(data.Close.iloc[-1])
+
+        if (self.cache is not None):
+            key = self.cache.key("pnf_columns", self.ticker, self.hash_of(data), self.box_size, self.reversal_amount)
+            cached = self.cache.get(key)
+            if (cached is not None):
+                # The cached values are shared with other charts, this one gets its own copies:
+                (opens, closes, closing_dates, self.first_streak_complete, self.current_streak, self.pnf_open,
+                 self.pnf_close) = cached
+                self.column_opens = np.empty(0)
+                self.column_closes = np.empty(0)
+                self.set_columns(opens, closes, 1)
+                self.closing_dates_list = list(closing_dates)
+                return self.pnf_data
+
+        # Second: build the columns in a single pass over High and Low prices and keep the column in progress,
+        # so that update() can continue from the last bar:
+        high = data.High.to_numpy()
+        low = data.Low.to_numpy()
+        current_streak, pnf_open, pnf_close, self.first_streak_complete = first_pnf_streak(high, low,
+                                                                                           self.box_size,
+                                                                                           self.reversal_amount)
+        opens, closes, positions, self.current_streak, self.pnf_open, self.pnf_close = extend_pnf_columns(
+            high, low, 1, current_streak, pnf_open, pnf_close, self.box_size, self.reversal_amount)
+
+        self.closing_dates_list = list(data.index[positions]) + [data.index[-1]]
+
+        self.column_opens = np.empty(0)
+        self.column_closes = np.empty(0)
+        self.set_columns(np.append(opens, self.pnf_open), np.append(closes, self.pnf_close), 1)
+        if (self.cache is not None):
+            self.cache.put(key, (self.column_opens[:self.n_columns].copy(), self.column_closes[:self.n_columns].copy(),
+                                 tuple(self.closing_dates_list), self.first_streak_complete, self.current_streak,
+                                 self.pnf_open, self.pnf_close))
+        return self.pnf_data
+
+    def hash_of(self, data):
+        # pnf_cache.data_hash of data, kept for self.data (update() clears it):
+        from pnf_cache import data_hash
+
+        if (data is not self.data):
+            return data_hash(data)
+        if (self.data_hash is None):
+            self.data_hash = data_hash(data)
+        return self.data_hash
+
+    def set_columns(self, opens, closes, first_column):
+        # Puts the columns on the box grid and writes them from column first_column on (the columns after them are
+        # dropped). The arrays keep spare room when they grow, so update() writes its few new columns in place.
+        n = first_column - 1 + len(opens)
+        if (n > len(self.column_opens)):
+            column_opens = np.empty(max(n, 2 * len(self.column_opens)))
+            column_closes = np.empty(max(n, 2 * len(self.column_closes)))
+            column_opens[:first_column - 1] = self.column_opens[:first_column - 1]
+            column_closes[:first_column - 1] = self.column_closes[:first_column - 1]
+            self.column_opens = column_opens
+            self.column_closes = column_closes
+        box_size = self.box_size
+        self.column_opens[first_column - 1:n] = box_size * np.round(np.asarray(opens, dtype=float) / box_size)
+        self.column_closes[first_column - 1:n] = box_size * np.round(np.asarray(closes, dtype=float) / box_size)
+        self.n_columns = n
+        self.pnf_frame = None
+
+    def update(self, new_bars):
+        # Adds the bars after the last date of self.data to the chart without processing the history again.
+        # Only the column in progress and the new columns are built, and only the triggers that can see them are
+        # checked again, so an update costs O(new bars), not O(all bars). The column arrays, closing_dates_list and
+        # the trigger lists are changed in place. Returns the updated trigger list.
+        # new_bars may come in any order (e.g. a file written by hand), on a repeated date the last bar is kept:
+        new_bars = new_bars.sort_index(kind="stable")
+        new_bars = new_bars[~new_bars.index.duplicated(keep="last")]
+        last_date = self.pending_bars[-1].index[-1] if (self.pending_bars != []) else self.data_frame.index[-1]
+        new_bars = new_bars[new_bars.index > last_date]
+        if (len(new_bars) == 0):
+            return self.check_triggers() if (self.trigger_list is None) else self.trigger_list
+
+        self.pending_bars.append(new_bars)
+        self.data_hash = None
+        last_column = self.n_columns
+
+        if (self.first_streak_complete):
+            opens, closes, positions, self.current_streak, self.pnf_open, self.pnf_close = extend_pnf_columns(
+                new_bars.High.to_numpy(), new_bars.Low.to_numpy(), 0, self.current_streak, self.pnf_open,
+                self.pnf_close, self.box_size, self.reversal_amount)
+
+            # The column in progress is replaced by the columns closed with the new bars and the new one in progress:
+            self.set_columns(np.append(opens, self.pnf_open), np.append(closes, self.pnf_close), last_column)
+            self.closing_dates_list[-1:] = list(new_bars.index[positions]) + [new_bars.index[-1]]
         else:
-            current_streak = "O"
-            pnf_open = data.iloc[0, ].High
-            pnf_close = lowest_price
-            pnf_data.loc[0, "open"] = pnf_open
-            pnf_data.loc[0, "close"] = pnf_close
-
-            # Third: update the streaks for each day:
-            # If current streak is "X":
-            #    1. Update upper interval (= High_today if it exceeds High_yesterday)
-            #    2. Check if the streak ends (it ends if todays min is below upper_interval - box_size)
-            #    3. if ends --> start an "O" streak, skip the next row in pnf_data.  If not ends do nothing.
-            #
-            # Apply similar logic if current_streak is "O"
-        closing_dates_list = []
-        for j in range(1, len(data)):
-            if (current_streak == "X"):
-                pnf_close = max(pnf_close, data.iloc[j, ].High)  # 1. Update upper interval
-
-                if (data.iloc[j, ].Low < pnf_close - (
-                        self.reversal_amount + 1) * self.box_size):  # 2. Check if the streak ends
-                    new_row = {"open": pnf_open, "close": pnf_close}
-                    pnf_data = pnf_data.append(new_row, ignore_index=True)
-
-                    closing_dates_list.append(data.index[j])
-                    current_streak = "O"
-                    pnf_open = pnf_close - self.box_size
-                    pnf_close = data.iloc[j, ].Low
-
-            else:
-                pnf_close = min(pnf_close, data.iloc[j, ].Low)  # 1. Update Lower interval
-
-                if (data.iloc[j, ].High > pnf_close + (
-                        self.reversal_amount + 1) * self.box_size):  # 2. Check if the streak ends
-                    new_row = {"open": pnf_open, "close": pnf_close}
-                    pnf_data = pnf_data.append(new_row, ignore_index=True)
-                    closing_dates_list.append(data.index[j])
-
-                    current_streak = "X"
-                    pnf_open = pnf_close + self.box_size
-                    pnf_close = data.iloc[j, ].High
-
-        new_row = {"open": pnf_open, "close": pnf_close}
-        pnf_data = pnf_data.append(new_row, ignore_index=True)
-        closing_dates_list.append(data.index[-1])
-
-        pnf_data.index = pnf_data.index.set_names(["rownbr"])
-        pnf_data = pnf_data.drop(0)
-        pnf_data = pnf_data.astype(float)
-        pnf_data = self.box_size * ((pnf_data / self.box_size).round())
-
-        self.closing_dates_list = closing_dates_list
-
-        return pnf_data
+            # The first streak is still open, it depends on the new bars so the chart is built again:
+            self.create_pnf_data(data=self.data)
+            last_column = 1
+
+        if (self.raw_trigger_list is None):
+            return self.check_triggers()
+
+        # A trigger at column i looks at most max(6, spread_trigger_wide) columns ahead, so the triggers before
+        # first_column do not change. The ones from first_column on are found again and the duplicates are removed
+        # from there on, starting from the state the removal had at first_column:
+        first_column = self.unchanged_before(last_column)
+        cut = bisect.bisect_left(self.raw_trigger_list, first_column, key=lambda trg: trg[1])
+        self.raw_trigger_list[cut:] = self.scan_triggers(first_column)
+        self.remove_duplicates(first_column)
+        self.window_index = None
+
+        return self.trigger_list
+
+    def unchanged_before(self, last_column):
+        # First column whose triggers can change when the column last_column (in progress) grows or new ones start:
+        return max(1, last_column - max(6, int(np.ceil(self.spread_trigger_wide))))
+
+    def remove_duplicates(self, first_column=1):
+        # trigger_list from raw_trigger_list (remove_duplicate_triggers). Only the triggers from first_column on are
+        # walked again, from the state of the removal kept at that column (dedupe_state), then the state at the
+        # column the next update starts from is kept.
+        state = self.dedupe_state
+        if (first_column == 1) or (state is None) or (state[0] != first_column):
+            state = (1, 0, frozenset(), 0, 0)
+            self.trigger_list = []
+        column, position, removed, skip, n_kept = state
+        kept, next_state = resume_duplicate_removal(self.raw_trigger_list, position, removed, skip,
+                                                    self.unchanged_before(self.n_columns))
+        self.trigger_list[n_kept:] = kept
+        self.dedupe_state = (next_state[0], next_state[1], next_state[2], next_state[3], n_kept + next_state[4])
 
     def create_plot_from_pnf_data(self, figure_size=(18, 15), chart_name="Point and Figure Chart", grid_freq_y=1,
-                                  grid_freq_x=1, lines = list()):
-        # Create the plot:
-        fig, ax = plt.subplots(figsize=figure_size)
-
-        prev_marker = "X"
-        for i in self.pnf_data.index:
-            if (self.pnf_data.loc[i, "close"] > self.pnf_data.loc[i, "open"]):
-                y_values = np.arange(self.pnf_data.loc[i, "open"], self.pnf_data.loc[i, "close"], self.box_size)
-                tmp_marker = "X"
-                prev_marker = "X"
-                cl = "g"
-
-            elif (self.pnf_data.loc[i, "close"] < self.pnf_data.loc[i, "open"]):
-                y_values = np.arange(self.pnf_data.loc[i, "close"], self.pnf_data.loc[i, "open"], self.box_size)
-                tmp_marker = "o"
-                prev_marker = "o"
-                cl = "r"
-
-            elif (prev_marker == "X"):
-                y_values = np.arange(self.pnf_data.loc[i, "close"], self.pnf_data.loc[i, "open"], self.box_size)
-                tmp_marker = "o"
-                cl = "r"
-
+                                  grid_freq_x=1, lines = list(), file_path=None):
+        import matplotlib.pyplot as plt
+        from pnf_render import draw_pnf
+
+        with self.metrics.stage(self.ticker, "plot") as counts:
+            # Create the plot (all boxes and lines are drawn at once, check pnf_render.draw_pnf):
+            fig, ax = plt.subplots(figsize=figure_size)
+            draw_pnf(ax, self.pnf_data.open.to_numpy(), self.pnf_data.close.to_numpy(), self.box_size,
+                     self.pnf_data.index.to_numpy(), chart_name=chart_name, grid_freq_y=grid_freq_y,
+                     grid_freq_x=grid_freq_x, lines=lines)
+
+            # Show the plot, or save it if a file path is given (png, svg, ... from the extension):
+            if (file_path is None):
+                fig.show()
             else:
-                y_values = np.arange(self.pnf_data.loc[i, "open"], self.pnf_data.loc[i, "close"], self.box_size)
-                tmp_marker = "X"
-                cl = "g"
-
-            sns.scatterplot(x=i, y=y_values, marker=tmp_marker, s=100, color=cl, ax = ax)
-
-        ax.set_ylabel("Price Level")
-        ax.set_title(chart_name)
-        ax.yaxis.set_minor_locator(AutoMinorLocator(grid_freq_y))
-        ax.xaxis.set_minor_locator(AutoMinorLocator(grid_freq_x))
-
-        ax.grid(visible=True, which='major', linestyle='--')
-        ax.grid(visible=True, which='minor', linestyle=':')
-
-        # Draw the lines:
-        for i in lines:
-            sns.lineplot( x=[i[0], i[1]], y=[i[2], i[3]], color = 'blue', ax = ax)
-
-        fig.show()
+                fig.savefig(file_path)
+                plt.close(fig)
+            counts["columns"] = len(self.pnf_data)
 
     def check_triggers(self):
-        # First add type column to pnf data:
-        pnf_with_type = self.pnf_data.copy(deep=False)
-        pnf_with_type["type"] = "X"
-        pnf_with_type.loc[pnf_with_type.open > pnf_with_type.close, "type"] = "O"
-        trigger_list = []
         # Format in trigger_list: (trigger_name, index (=column # in the graph), length (=horizontal length in graph))
+        with self.metrics.stage(self.ticker, "check_triggers") as counts:
+            cached = None
+            if (self.cache is not None):
+                key = self.cache.key("triggers", self.ticker, self.hash_of(self.data), self.box_size,
+                                     self.reversal_amount, self.spread_trigger_wide)
+                cached = self.cache.get(key)
+            if (cached is not None):
+                self.raw_trigger_list, self.trigger_list = list(cached[0]), list(cached[1])
+                self.dedupe_state = None
+            else:
+                self.raw_trigger_list = self.scan_triggers(1)
+                self.remove_duplicates(1)
+                if (self.cache is not None):
+                    self.cache.put(key, (tuple(self.raw_trigger_list), tuple(self.trigger_list)))
+            self.window_index = None
+            counts["columns"] = self.n_columns
+            counts["triggers"] = len(self.trigger_list)
+
+        return self.trigger_list
+
+    def scan_triggers(self, first_column):
+        # Returns the triggers of the columns from first_column on, before the duplicates are removed:
+        opens = self.column_opens[first_column - 1:self.n_columns]
+        closes = self.column_closes[first_column - 1:self.n_columns]
+        return find_triggers(closes, ~(opens > closes), spread_trigger_wide=self.spread_trigger_wide,
+                             first_column=first_column)
+
+    def triggers_between(self, start_date=None, end_date=None, trigger_list=None, strict_start=True):
+        # Returns the triggers whose breakout column (column + width) closes between start_date and end_date, both
+        # included (None = no limit), in the order of trigger_list (default: the last check_triggers / update result).
+        # The breakout column may have started before start_date. With strict_start=True such a trigger is kept
+        # only if its level (trigger_levels) was not passed before start_date (box rounded High above the level for
+        # bullish triggers, Low below it for bearish triggers), i.e. if the breakout itself is in the window.
+        # The window is found with binary searches on a sorted index of the closing dates, which is built once for
+        # each trigger list, so a query costs O(log n) plus the number of triggers returned.
+        if (trigger_list is None):
+            trigger_list = self.check_triggers() if (self.trigger_list is None) else self.trigger_list
+        if (self.window_index is None) or (self.window_index[0] is not trigger_list):
+            self.window_index = self.create_window_index(trigger_list)
+        bar_dates, closing_dates, breakout_dates, order = self.window_index[1:]
+
+        first = 0 if (start_date is None) else np.searchsorted(breakout_dates, to_nanoseconds(start_date), "left")
+        last = len(order) if (end_date is None) else np.searchsorted(breakout_dates, to_nanoseconds(end_date), "right")
+        selected = np.sort(order[first:last])
+
+        if (strict_start) and (start_date is not None):
+            start = to_nanoseconds(start_date)
+            first_bar_in_window = np.searchsorted(bar_dates, start, "left")
+            kept = []
+            selected = selected.tolist()
+            levels = list_trigger_levels(self, [trigger_list[k] for k in selected])
+            for k, level in zip(selected, levels):
+                name, column, width = trigger_list[k]
+                breakout = column + width
+                column_start = closing_dates[breakout - 2] if (breakout > 1) else bar_dates[0]
+                if (column_start < start):
+                    # Bars of the breakout column before the window:
+                    bars = self.data.iloc[np.searchsorted(bar_dates, column_start, "left"):first_bar_in_window]
+                    if (name in BULLISH_NAMES):
+                        passed = (self.box_size * np.round(bars.High.to_numpy(dtype=float) / self.box_size) > level).any()
+                    else:
+                        passed = (self.box_size * np.round(bars.Low.to_numpy(dtype=float) / self.box_size) < level).any()
+                    if (passed):
+                        continue
+                kept.append(k)
+            selected = kept
+
+        return [trigger_list[k] for k in selected]
+
+    def create_window_index(self, trigger_list):
+        # (trigger_list, dates of the bars, closing dates of the columns, sorted closing dates of the breakout columns,
+        #  trigger order), dates as nanoseconds
+        bar_dates = self.data.index.as_unit("ns").asi8
+        closing_dates = pd.DatetimeIndex(self.closing_dates_list).as_unit("ns").asi8
+        breakout_columns = np.array([trg[1] + trg[2] for trg in trigger_list], dtype=np.int64)
+        breakout_dates = closing_dates[breakout_columns - 1] if (len(trigger_list) > 0) else np.empty(0, dtype=np.int64)
+        order = np.argsort(breakout_dates, kind="stable")
+        return trigger_list, bar_dates, closing_dates, breakout_dates[order], order
+
+
+# Following functions build the pnf columns:
+
+def default_box_size(last_price):
+    box_size = 0.05
+    if (last_price > 1):
+        box_size = 0.10
+    if (last_price > 2):
+        box_size = 0.25
+    if (last_price > 5):
+        box_size = 0.5
+    if (last_price > 20):
+        box_size = 1
+    if (last_price > 100):
+        box_size = 2
+    if (last_price > 200):
+        box_size = 4
+
+    return box_size
+
+
+def pnf_columns(high, low, box_size, reversal_amount):
+    # Returns (opens, closes, positions) as numpy arrays. opens and closes are not rounded to the box grid yet,
+    # positions keeps the bar number that closes each column. The last column is the one still in progress,
+    # it is closed at the last bar.
+    current_streak, pnf_open, pnf_close, first_streak_complete = first_pnf_streak(high, low, box_size,
+                                                                                  reversal_amount)
+    opens, closes, positions, current_streak, pnf_open, pnf_close = extend_pnf_columns(high, low, 1,
+                                                                                       current_streak,
+                                                                                       pnf_open,
+                                                                                       pnf_close,
+                                                                                       box_size,
+                                                                                       reversal_amount)
+    opens = np.append(opens, pnf_open)
+    closes = np.append(closes, pnf_close)
+    positions = np.append(positions, len(high) - 1)
+
+    return opens, closes, positions
+
+
+def first_pnf_streak(high, low, box_size, reversal_amount):
+    # Returns (current_streak, pnf_open, pnf_close, first_streak_complete) for the first streak.
+    # first_streak_complete is False if the prices never moved (reversal_amount + 1) boxes, then the first
+    # streak depends on bars that are not available yet.
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+
+    lowest_price = low[0]
+    highest_price = high[0]
+    diff = highest_price - lowest_price
+    i = 1
+    while (diff < (reversal_amount + 1) * box_size) and (i < len(high)):
+        lowest_price = min(lowest_price, low[i])
+        highest_price = max(highest_price, high[i])
+        diff = highest_price - lowest_price
+        i += 1
+
+    if ((highest_price - low[0]) > (high[0] - lowest_price)):
+        # If highest price is increased more than lowest price decreased --> first streak is "X". Otherwise "O"
+        return "X", float(low[0]), float(highest_price), bool(diff >= (reversal_amount + 1) * box_size)
+
+    return "O", float(high[0]), float(lowest_price), bool(diff >= (reversal_amount + 1) * box_size)
+
+
+def extend_pnf_columns(high, low, start, current_streak, pnf_open, pnf_close, box_size, reversal_amount):
+    # Continues the streak (current_streak, pnf_open, pnf_close) with the bars from position start on.
+    # Returns the columns closed on the way as (opens, closes, positions) and the state of the column in progress.
+    high = np.asarray(high, dtype=float).tolist()
+    low = np.asarray(low, dtype=float).tolist()
+    n = len(high)
+
+    # A column can close at most once per bar, so n slots are always enough:
+    opens = np.empty(max(n - start, 0))
+    closes = np.empty(max(n - start, 0))
+    positions = np.empty(max(n - start, 0), dtype=np.int64)
+    reversal_range = (reversal_amount + 1) * box_size
+    k = 0
+
+    # Update the streaks for each day:
+    #    1. Update the running close (= High_today if it exceeds it for "X", Low_today if it is below it for "O")
+    #    2. Check if the streak ends (for "X" it ends if todays min is below close - (reversal_amount + 1) * box_size)
+    #    3. If ends --> store the column and start the opposite streak one box away.
+    for j in range(start, n):
+        if (current_streak == "X"):
+            if (high[j] > pnf_close):
+                pnf_close = high[j]
+
+            if (low[j] < pnf_close - reversal_range):
+                opens[k] = pnf_open
+                closes[k] = pnf_close
+                positions[k] = j
+                k += 1
+
+                current_streak = "O"
+                pnf_open = pnf_close - box_size
+                pnf_close = low[j]
 
-        # for each row of pnf_data check the triggers:
-        for i in pnf_with_type.index:
-
-            # Check double top and double bottom triggers Also check ascending triples:
-            if (i <= len(pnf_with_type) - 2):
-                if (pnf_with_type.loc[i, "type"] == "X"):
-                    if (check_double_top_breakout(pnf_with_type, i)):
-                        trigger_list.append(
-                            ("double_top_breakout", i, 2))  # If there is ascending triple top, remove this
-
-                        # Now check if there is ascending triple top:
-                        if (i + 2 <= len(pnf_with_type) - 2):
-                            if (check_double_top_breakout(pnf_with_type, i + 2)):
-                                trigger_list.append(("ascending_triple_top_breakout", i, 4))
-
-                else:
-                    if (check_double_bottom_breakdown(pnf_with_type, i)):
-                        trigger_list.append(
-                            ("double_bottom_breakdown", i, 2))  # If there is descending_triple_bottom, remove this
-
-                        # Now check if there is descending triple bottom:
-                        if (i + 2 <= len(pnf_with_type) - 2):
-                            if (check_double_bottom_breakdown(pnf_with_type, i + 2)):
-                                trigger_list.append(("descending_triple_bottom_breakdown", i, 4))
-
-                                # Check for Triple top and bottom Also add spread triple top and bottom:
-            if (i <= len(pnf_with_type) - 4):
-                if (pnf_with_type.loc[i, "type"] == "X"):
-                    if (check_triple_top_breakout(pnf_with_type, i)):
-                        trigger_list.append(("triple_top_breakout", i, 4))
-                    else:  # if we dont have triple top then check for spread triple top:
-                        sp_res = check_spread_triple_top_breakout(pnf_with_type,
-                                                                  i,
-                                                                  spread_trigger_wide = self.spread_trigger_wide)
-                        # observe for example True,5 is returned
-                        if (sp_res[0]):
-                            trigger_list.append(("spread_triple_top_breakout", i, sp_res[1]))
-                else:
-                    if (check_triple_bottom_breakdown(pnf_with_type, i)):
-                        trigger_list.append(("triple_bottom_breakdown", i, 4))
-                    else:  # if we dont have triple bottom then check for spread triple bottom:
-                        sp_res = check_spread_triple_bottom_breakdown(pnf_with_type, i, spread_trigger_wide = self.spread_trigger_wide)
-                        if (sp_res[0]):
-                            trigger_list.append(("spread_triple_bottom_breakdown", i, sp_res[1]))
-
-            # Check quadrople top and quadrople bottom triggers:
-            if (i <= len(pnf_with_type) - 6):
-
-                if (pnf_with_type.loc[i, "type"] == "X"):
-                    if (check_quadruple_top_breakout(pnf_with_type, i)):
-                        trigger_list.append(("quadruple_top_breakout", i, 6))
-                else:
-                    if (check_quadruple_bottom_breakdown(pnf_with_type, i)):
-                        trigger_list.append(("quadruple_bottom_breakdown", i, 6))
-
-                        # For ascending and descending triple top breakout, remove prev and after doubles.
-        for trg in trigger_list:
-            if (trg[0] == "ascending_triple_top_breakout"):
-                if (('double_top_breakout', trg[1], 2) in trigger_list):
-                    trigger_list.remove(('double_top_breakout', trg[1], 2))
-                if (('double_top_breakout', trg[1] + 2, 2) in trigger_list):
-                    trigger_list.remove(('double_top_breakout', trg[1] + 2, 2))
-
-            if (trg[0] == "descending_triple_bottom_breakout"):
-                if (('double_bottom_breakdown', trg[1], 2) in trigger_list):
-                    trigger_list.remove(('double_bottom_breakdown', trg[1], 2))
-                if (('double_bottom_breakdown', trg[1] + 2, 2) in trigger_list):
-                    trigger_list.remove(('double_bottom_breakdown', trg[1] + 2, 2))
-
-        return trigger_list
+        else:
+            if (low[j] < pnf_close):
+                pnf_close = low[j]
+
+            if (high[j] > pnf_close + reversal_range):
+                opens[k] = pnf_open
+                closes[k] = pnf_close
+                positions[k] = j
+                k += 1
+
+                current_streak = "X"
+                pnf_open = pnf_close + box_size
+                pnf_close = high[j]
+
+    return opens[:k], closes[:k], positions[:k], current_streak, pnf_open, pnf_close
+
+
+def to_nanoseconds(date):
+    # "yyyy-mm-dd" strings, dates and timestamps as nanoseconds since epoch (as in DatetimeIndex.asi8):
+    return pd.Timestamp(date).as_unit("ns").value
+
+
+# Following functions find the triggers on all columns at once:
+
+def find_triggers(closes, is_x, spread_trigger_wide=15, first_column=1):
+    # closes and is_x (True for "X" columns) hold the columns from first_column up to the last column.
+    # Every pattern is checked on all columns with shifted comparisons of the closes, i.e. c2 > c0 compares the
+    # close of each column with the close two columns later. Returns the same triggers, in the same order, as the
+    # check_* functions applied column by column.
+    c = np.asarray(closes, dtype=float)
+    x = np.asarray(is_x, dtype=bool)
+    n = len(c)
+
+    def shifted(k):
+        # Close k columns ahead of each column (nan if there is no such column):
+        res = np.full(n, np.nan)
+        res[:max(n - k, 0)] = c[k:]
+        return res
+
+    col = np.arange(n)
+    c2 = shifted(2)
+    c4 = shifted(4)
+    c6 = shifted(6)
+    found = []  # (column positions, order in the column, trigger name, lengths)
+
+    # Double top / bottom and ascending / descending triples:
+    double_top = x & (col <= n - 3) & (c2 > c)
+    double_bottom = ~x & (col <= n - 3) & (c2 < c)
+    found.append((np.flatnonzero(double_top), 0, "double_top_breakout", 2))
+    found.append((np.flatnonzero(double_top & (col <= n - 5) & (c4 > c2)), 1, "ascending_triple_top_breakout", 4))
+    found.append((np.flatnonzero(double_bottom), 0, "double_bottom_breakdown", 2))
+    found.append((np.flatnonzero(double_bottom & (col <= n - 5) & (c4 < c2)), 1,
+                  "descending_triple_bottom_breakdown", 4))
+
+    # Triple top / bottom, if there is not one then spread triple top / bottom:
+    triple_range = (col <= n - 5)
+    triple_top = x & triple_range & (c2 == c) & (c4 > c)
+    triple_bottom = ~x & triple_range & (c2 == c) & (c4 < c)
+    found.append((np.flatnonzero(triple_top), 2, "triple_top_breakout", 4))
+    found.append((np.flatnonzero(triple_bottom), 2, "triple_bottom_breakdown", 4))
+
+    spread_top = x & triple_range & ~triple_top & ((c2 == c) | ((c4 == c) & (c2 < c)))
+    spread_bottom = ~x & triple_range & ~triple_bottom & ((c2 == c) | ((c4 == c) & (c2 > c)))
+    top_length = np.zeros(n, dtype=np.int64)
+    bottom_length = np.zeros(n, dtype=np.int64)
+    lngth = 6
+    while (lngth < spread_trigger_wide) and (lngth < n - 1):
+        # Only the first breakout column counts and the last column is never used (as in the check_* functions):
+        in_range = (col + lngth < n - 1)
+        cl = shifted(lngth)
+        hit = spread_top & in_range & (top_length == 0) & (cl > c)
+        top_length[hit] = lngth
+        hit = spread_bottom & in_range & (bottom_length == 0) & (cl < c)
+        bottom_length[hit] = lngth
+        lngth += 2
+    found.append((np.flatnonzero(top_length), 2, "spread_triple_top_breakout", top_length))
+    found.append((np.flatnonzero(bottom_length), 2, "spread_triple_bottom_breakdown", bottom_length))
+
+    # Quadruple top / bottom:
+    quadruple = (col <= n - 7) & (c2 == c) & (c4 == c)
+    found.append((np.flatnonzero(x & quadruple & (c6 > c)), 3, "quadruple_top_breakout", 6))
+    found.append((np.flatnonzero(~x & quadruple & (c6 < c)), 3, "quadruple_bottom_breakdown", 6))
+
+    # Sort by column and by the order of the checks in a column:
+    positions = np.concatenate([pos for pos, order, name, length in found])
+    orders = np.concatenate([np.full(len(pos), order) for pos, order, name, length in found])
+    names = [name for pos, order, name, length in found for _ in range(len(pos))]
+    lengths = np.concatenate([length[pos] if isinstance(length, np.ndarray) else np.full(len(pos), length)
+                              for pos, order, name, length in found])
+    sort_order = np.lexsort((orders, positions))
+    columns = (positions + first_column).tolist()
+    lengths = lengths.tolist()
+
+    return [(names[k], columns[k], lengths[k]) for k in sort_order.tolist()]
+
+
+def trigger_levels(closes, columns, widths, bullish):
+    # Price level that the breakout column of each trigger (column, width) has to pass: the highest close (lowest
+    # for bearish triggers) of the columns column, column + 2, ..., column + width - 2. closes holds all columns
+    # (closes[0] is column 1). It is the close of the column for most patterns, but an ascending triple top is only
+    # confirmed when the close of column + 2 is passed (and a descending triple bottom below column + 2).
+    closes = np.asarray(closes, dtype=float)
+    columns = np.asarray(columns, dtype=np.int64)
+    widths = np.asarray(widths, dtype=np.int64)
+    bullish = np.asarray(bullish, dtype=bool)
+    levels = closes[columns - 1]
+    for step in range(2, int(widths.max(initial=0)) - 1, 2):
+        inside = step < widths
+        other = closes[np.where(inside, columns - 1 + step, columns - 1)]
+        levels = np.where(bullish, np.maximum(levels, other), np.minimum(levels, other))
+    return levels
+
+
+def remove_duplicate_triggers(trigger_list):
+    # For ascending and descending triple top breakout, remove prev and after doubles.
+    # The result is the same as removing them with list.remove while walking over trigger_list (a removal before
+    # the current trigger makes that walk skip the next one), but the lookups use a dictionary of positions.
+    return resume_duplicate_removal(trigger_list, 0, frozenset(), 0, None)[0]
+
+
+def resume_duplicate_removal(trigger_list, start, removed, skip, stop_column):
+    # The walk of remove_duplicate_triggers from position start of trigger_list (sorted by column), with the state
+    # it had there: the triggers after start that are already removed and the number of triggers to skip.
+    # A triple only removes doubles of its own column and two columns later, so once the walk reaches a new column
+    # the triggers before it are final. Returns (kept, state): kept are the triggers from start on that are not
+    # removed, state = (column, position, removed, skip, number of kept triggers from start) at the first trigger of
+    # column stop_column or later, to resume from there (None: no state is kept).
+    position = {trg: k for k, trg in enumerate(trigger_list[start:], start)}
+    removed = set(removed)
+    state = None
+    for k in range(start, len(trigger_list) + 1):
+        if (state is None) and (stop_column is not None) and \
+                ((k == len(trigger_list)) or (trigger_list[k][1] >= stop_column)):
+            state = (stop_column, k, frozenset(trg for trg in removed if position.get(trg, -1) >= k), skip,
+                     sum(1 for trg in trigger_list[start:k] if trg not in removed))
+        if (k == len(trigger_list)):
+            break
+
+        trg = trigger_list[k]
+        if (trg in removed):
+            continue
+        if (skip > 0):
+            skip -= 1
+            continue
+
+        if (trg[0] == "ascending_triple_top_breakout"):
+            doubles = [("double_top_breakout", trg[1], 2), ("double_top_breakout", trg[1] + 2, 2)]
+        elif (trg[0] == "descending_triple_bottom_breakout"):
+            # Descending triples are named "..._breakdown", so their doubles are kept (as before).
+            doubles = [("double_bottom_breakdown", trg[1], 2), ("double_bottom_breakdown", trg[1] + 2, 2)]
+        else:
+            continue
+
+        for double in doubles:
+            q = position.get(double)
+            if (q is not None) and (double not in removed):
+                removed.add(double)
+                if (q < k):
+                    skip += 1
+
+    return [trg for trg in trigger_list[start:] if trg not in removed], state
 
 
 # Following functions are for bullish triggers:
@@ -345,48 +665,45 @@ def check_quadruple_bottom_breakdown(df, ind):
     return ret
 
 
-if __name__ == '__main__':
-    # Get the parameters:
-    locale.setlocale(locale.LC_ALL, str('en_US.UTF-8'))
-    msg = "Please enter the parameters.\n" \
-          "Be careful with the format and leave the box empty to use default values (check readme file)."
-    title = "PnF Trigger Parameters"
+# Following functions are used by the script to run a scan:
 
-    fieldNames = ["Start date (format: yyyy-mm-dd)",
-                  "End_date (format: yyyy-mm-dd)",
-                  "Reversal amount (format: float)",
-                  "Box size (format: float)",
-                  "Last n days for triggers (format: int)",
-                  "spread_trigger_wide (format: int)",
-                  "Would you like to download data? (format: yes/no)"]
+BULLISH_NAMES = ["double_top_breakout", "ascending_triple_top_breakout", "triple_top_breakout", "spread_triple_top_breakout", "quadruple_top_breakout"]
+BEARISH_NAMES = ["double_bottom_breakdown", "descending_triple_bottom_breakdown", "triple_bottom_breakdown", "spread_triple_bottom_breakdown", "quadruple_bottom_breakdown"]
 
-    fieldValues = easygui.multenterbox(msg, title, fieldNames)
-    if fieldValues is None:
-        sys.exit(0)
+FIELD_NAMES = ["Start date (format: yyyy-mm-dd)",
+               "End_date (format: yyyy-mm-dd)",
+               "Reversal amount (format: float)",
+               "Box size (format: float)",
+               "Last n days for triggers (format: int)",
+               "spread_trigger_wide (format: int)",
+               "Would you like to download data? (format: yes/no)",
+               "Number of processes (format: int)"]
 
-    #Fix the format of parameters:
 
-    start_date = str(fieldValues[0]).strip()
+def parse_parameters(field_values):
+    # Fixes the format of the parameters given as strings (in the order of FIELD_NAMES).
+    # An empty string means the default value (check readme file).
+    start_date = str(field_values[0]).strip()
     if (start_date == ""):
         start_date = "2021-01-01"
 
-    end_date = str(fieldValues[1]).strip()
+    end_date = str(field_values[1]).strip()
     if (end_date == ""):
         end_date = str(dt.date.today())
 
-    reversal_amount = str(fieldValues[2]).strip()
+    reversal_amount = str(field_values[2]).strip()
     if (reversal_amount == ""):
         reversal_amount = 3
     else:
         reversal_amount = float(reversal_amount)
 
-    box_size = str(fieldValues[3]).strip()
+    box_size = str(field_values[3]).strip()
     if (box_size == ""):
         box_size = None
     else:
         box_size = float(box_size)
 
-    last_n_days = str(fieldValues[4]).strip()
+    last_n_days = str(field_values[4]).strip()
     start = dt.datetime.strptime(start_date, "%Y-%m-%d").date()
     end = dt.datetime.strptime(end_date, "%Y-%m-%d").date()
     if (last_n_days == ""):
@@ -394,100 +711,253 @@ if __name__ == '__main__':
     else:
         last_n_days = int(last_n_days)
 
-    spread_trigger_wide = str(fieldValues[5]).strip()
+    spread_trigger_wide = str(field_values[5]).strip()
     if (spread_trigger_wide == ""):
         spread_trigger_wide = 15
     else:
         spread_trigger_wide = float(spread_trigger_wide)
 
-    first_date_for_trigger = end - dt.timedelta(days = last_n_days)
-
-    get_data = str(fieldValues[6]).strip().lower()
-
+    get_data = str(field_values[6]).strip().lower()
     if (get_data == ""):
         get_data = "yes"
-    if (get_data=="yes"):
-        get_data=True
+    get_data = (get_data == "yes")
+
+    processes = str(field_values[7]).strip()
+    if (processes == ""):
+        processes = None
     else:
-        get_data=False
+        processes = int(processes)
+
+    return {"start_date": start_date,
+            "end_date": end_date,
+            "reversal_amount": reversal_amount,
+            "box_size": box_size,
+            "last_n_days": last_n_days,
+            "spread_trigger_wide": spread_trigger_wide,
+            "get_data": get_data,
+            "processes": processes,
+            "concurrency": 8,
+            "first_date_for_trigger": pd.Timestamp(end - dt.timedelta(days=last_n_days))}
+
+
+def run_scan(ticker_list, params):
+    # Builds the charts of all tickers and keeps the triggers after params["first_date_for_trigger"].
+    # Returns (pnf_obj_dic, stock_triggers), tickers without triggers are not in stock_triggers.
+    # Stage timings are recorded if params["metrics"] is a pnf_metrics.ScanMetrics, charts and triggers are reused
+    # from params["cache"] if it is a pnf_cache.ResultCache.
+    from pnf_batch import scan_tickers
+    from pnf_sources import load_tickers
+
+    # Fill the local store first, the missing bars of params["concurrency"] tickers are downloaded at a time:
+    store = params.get("store") or OhlcStore()
+    metrics = params.get("metrics") or NULL_METRICS
+    loaded = load_tickers(ticker_list, params["start_date"], params["end_date"], store=store,
+                          concurrency=params.get("concurrency", 8), metrics=metrics)
+
+    # Build the charts and check the triggers of the loaded tickers on a pool of processes. The workers only read
+    # the store (download=False), a ticker is not downloaded a second time without the retries of load_tickers:
+    pnf_obj_dic = {}
+    trigger_list_dic = {}
+    for ticker, pnf_obj, trigger_list in scan_tickers([ticker for ticker in ticker_list if (ticker in loaded)],
+                                                      processes=params["processes"],
+                                                      start_date=params["start_date"],
+                                                      end_date=params["end_date"],
+                                                      reversal_amount=params["reversal_amount"],
+                                                      box_size=params["box_size"],
+                                                      last_n_days=params["last_n_days"],
+                                                      spread_trigger_wide=params["spread_trigger_wide"],
+                                                      get_data=params["get_data"],
+                                                      store=store,
+                                                      download=False,
+                                                      metrics=metrics,
+                                                      cache=params.get("cache")):
+        pnf_obj_dic[ticker] = pnf_obj
+        trigger_list_dic[ticker] = trigger_list
+
+    # Now filter the triggers for each stock (in the order of ticker_list) and store them in a dictionary:
+    stock_triggers = {}
+    for i in [ticker for ticker in ticker_list if ticker in pnf_obj_dic]:
+        with metrics.stage(i, "triggers_between") as counts:
+            final_temp_trig_list = pnf_obj_dic[i].triggers_between(params["first_date_for_trigger"], None,
+                                                                   trigger_list_dic[i])
+            counts["triggers"] = len(final_temp_trig_list)
+        if final_temp_trig_list != []:
+            stock_triggers[i] = final_temp_trig_list
+
+    return pnf_obj_dic, stock_triggers
+
+
+def trigger_lines(pnf_obj, trigger_list):
+    # Horizontal lines at the price level of each trigger (trigger_levels), format: ( x_start, x_end, y_start, y_end )
+    lines = []
+    levels = list_trigger_levels(pnf_obj, trigger_list)
+    for i, level in zip(trigger_list, levels):
+        x_start = i[1]
+        x_end = i[1] + i[2]
+        y_start = level
+        y_end = y_start
+        lines.append((x_start, x_end, y_start, y_end))
+
+    return lines
+
+
+def list_trigger_levels(pnf_obj, trigger_list):
+    # trigger_levels of the triggers in trigger_list, as a list of floats:
+    if (trigger_list == []):
+        return []
+    return trigger_levels(pnf_obj.pnf_data.close.to_numpy(),
+                          [trg[1] for trg in trigger_list],
+                          [trg[2] for trg in trigger_list],
+                          [trg[0] in BULLISH_NAMES for trg in trigger_list]).tolist()
+
+
+def trigger_rows(ticker, pnf_obj, trigger_list):
+    # One row per trigger. trigger_date is the closing date of the breakout column (column + width).
+    rows = []
+    levels = list_trigger_levels(pnf_obj, trigger_list)
+    for (name, column, width), level in zip(trigger_list, levels):
+        rows.append({"ticker": ticker,
+                     "pattern": name,
+                     "side": "bullish" if (name in BULLISH_NAMES) else "bearish",
+                     "column": int(column),
+                     "width": int(width),
+                     "price_level": level,
+                     "trigger_date": str(pnf_obj.closing_dates_list[column + width - 1].date())})
+
+    return rows
+
+
+def triggers_file_path(extension):
+    return "trigger_lists/triggers_{}.{}".format(str(dt.datetime.today())[:-7], extension).replace(":", "_").replace("-", "_").replace(" ", "_")
+
+
+def run_headless(argv):
+    # Command line mode, every field of the parameters form is a flag (check readme file).
+    # Returns the exit status: 1 if none of the tickers could be analysed, 0 otherwise.
+    import argparse
+    import csv
+    import json
+
+    parser = argparse.ArgumentParser(description="Point and figure triggers for the tickers in a file.")
+    parser.add_argument("--start-date", default="", help="yyyy-mm-dd, default 2021-01-01")
+    parser.add_argument("--end-date", default="", help="yyyy-mm-dd, default today")
+    parser.add_argument("--reversal-amount", default="", help="float, default 3")
+    parser.add_argument("--box-size", default="", help="float, default depends on the last price")
+    parser.add_argument("--last-n-days", default="", help="int, default all days from start date to end date")
+    parser.add_argument("--spread-trigger-wide", default="", help="int, default 15")
+    parser.add_argument("--download", default="", help="yes/no, save the downloaded data as csv (default yes)")
+    parser.add_argument("--processes", default="", help="int, default all cores")
+    parser.add_argument("--concurrency", default=8, type=int, help="tickers downloaded at the same time, default 8")
+    parser.add_argument("--data-dir", default=None, help="read the bars from <ticker>.csv / <ticker>.parquet files here")
+    parser.add_argument("--tickers", default="tickers.txt", help="file with the tickers separated by spaces")
+    parser.add_argument("--metrics-file", default=None, help="if given, the time of each stage per ticker is saved here")
+    parser.add_argument("--metrics-format", default="jsonl", choices=["jsonl", "prometheus"])
+    parser.add_argument("--cache-dir", default=None, help="if given, charts and triggers are cached here between runs")
+    parser.add_argument("--cache-size", default=512, type=int, help="MB kept in the cache directory, default 512")
+    parser.add_argument("--output-format", default="json", choices=["json", "csv"])
+    parser.add_argument("--output", default=None, help="output file, default trigger_lists/triggers_<time>.<format>")
+    parser.add_argument("--charts-dir", default=None, help="if given, the charts of tickers with triggers are saved here")
+    parser.add_argument("--chart-format", default="png", choices=["png", "svg", "pdf"])
+    args = parser.parse_args(argv)
+
+    params = parse_parameters([args.start_date, args.end_date, args.reversal_amount, args.box_size,
+                               args.last_n_days, args.spread_trigger_wide, args.download, args.processes])
+    params["concurrency"] = args.concurrency
+    if (args.data_dir is not None):
+        from pnf_sources import LocalFilesProvider
+        params["store"] = OhlcStore(os.path.join(args.data_dir, "store"), provider=LocalFilesProvider(args.data_dir))
+    if (args.metrics_file is not None):
+        from pnf_metrics import ScanMetrics
+        params["metrics"] = ScanMetrics()
+    if (args.cache_dir is not None):
+        from pnf_cache import ResultCache
+        params["cache"] = ResultCache(args.cache_dir, max_bytes=args.cache_size * 2 ** 20)
+
+    with open(args.tickers, "r") as txt_file:
+        ticker_list = txt_file.read().split()
+
+    pnf_obj_dic, stock_triggers = run_scan(ticker_list, params)
+    if (pnf_obj_dic == {}) and (ticker_list != []):
+        # Nothing could be analysed, an empty trigger file would look like a scan without triggers:
+        print("None of the {} tickers could be analysed".format(len(ticker_list)))
+        return 1
+
+    rows = []
+    for i in stock_triggers:
+        rows += trigger_rows(i, pnf_obj_dic[i], stock_triggers[i])
+
+    file_path = args.output or triggers_file_path(args.output_format)
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    if (args.output_format == "json"):
+        with open(file_path, "w") as f:
+            json.dump(rows, f, indent=1)
+    else:
+        with open(file_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["ticker", "pattern", "side", "column", "width", "price_level",
+                                                   "trigger_date"])
+            writer.writeheader()
+            writer.writerows(rows)
+    print("{} triggers written to {}".format(len(rows), file_path))
+
+    if (args.charts_dir is not None):
+        from pnf_render import render_charts
+        charts = {i: pnf_obj_dic[i] for i in stock_triggers}
+        for file_path in render_charts(charts, stock_triggers, args.charts_dir, file_format=args.chart_format,
+                                       processes=params["processes"], metrics=params.get("metrics")):
+            print("Chart saved to {}".format(file_path))
+
+    if (args.metrics_file is not None):
+        if (args.metrics_format == "jsonl"):
+            params["metrics"].write_jsonl(args.metrics_file)
+        else:
+            params["metrics"].write_prometheus(args.metrics_file)
+        print(params["metrics"].stage_summary())
+
+    return 0
+
+
+if __name__ == '__main__':
+    # Without arguments the parameters are asked with a form, otherwise the scan runs from command line:
+    if (len(sys.argv) > 1):
+        sys.exit(run_headless(sys.argv[1:]))
+
+    import locale
+    import easygui
+
+    # Get the parameters:
+    locale.setlocale(locale.LC_ALL, str('en_US.UTF-8'))
+    msg = "Please enter the parameters.\n" \
+          "Be careful with the format and leave the box empty to use default values (check readme file)."
+    title = "PnF Trigger Parameters"
 
+    fieldValues = easygui.multenterbox(msg, title, FIELD_NAMES)
+    if fieldValues is None:
+        sys.exit(0)
+
+    #Fix the format of parameters:
+    params = parse_parameters(fieldValues)
 
     txt_file = open("tickers.txt", 'r')
     content = txt_file.read()
     txt_file.close()
     ticker_list = content.split()
-    pnf_obj_dic = {}
-    for i in ticker_list:
-        pnf_obj_dic[i] = PnfAnalysis(i,
-                                     start_date=start_date,
-                                     end_date=end_date,
-                                     reversal_amount=reversal_amount,
-                                     box_size=box_size,
-                                     last_n_days=last_n_days,
-                                     spread_trigger_wide=spread_trigger_wide,
-                                     get_data=get_data)
-
-    #Now get the triggers for each stock and store them in a dictionary:
-    stock_triggers = {}
-
-    for i in pnf_obj_dic:
-        temp_trig_list = pnf_obj_dic[i].check_triggers()
-        temp_pnf_data = pnf_obj_dic[i].pnf_data
-        date_list = pnf_obj_dic[i].closing_dates_list
-
-        #Calculate the first_date_col_number:
-        my_date = date_list[0]
-        first_date_col_number = 1
-        while my_date < first_date_for_trigger:
-            first_date_col_number += 1
-            my_date = date_list[first_date_col_number]
-
-        #Calculate last column of pnf data_to use:
-
-        final_temp_trig_list = list(temp_trig_list)
-        for j in temp_trig_list:
-            pnf_col_num = j[1]
-            pnf_wide = j[2]
-            if (date_list[pnf_col_num + pnf_wide - 1] < first_date_for_trigger): #If before triggering date, drop the trigger
-                final_temp_trig_list.remove(j)
-                first_date_col_number = pnf_col_num + pnf_wide + 1 # Find the column of -15th day
-
-            elif (pnf_col_num + pnf_wide == first_date_col_number):
-
-                temp_data = pnf_obj_dic[i].data
-                price_level = temp_pnf_data.loc[pnf_col_num, "close"] #This keeps the price level of trigger
-                try:
-                    temp_min = temp_data.loc[first_date_for_trigger, "Low"]
-                    temp_max = temp_data.loc[first_date_for_trigger, "High"]
-                    my_bool = (price_level < temp_max) and (price_level > temp_min)
-                except:
-                    my_bool = True
-                
-                if my_bool == False:
-                    final_temp_trig_list.remove(j)
-
-        # add the trigger list to dictionary
-        if final_temp_trig_list != []:
-            stock_triggers[i] = final_temp_trig_list
 
+    pnf_obj_dic, stock_triggers = run_scan(ticker_list, params)
 
     #Now display the bearish and bullish triggers.
 
-    bullish_names = ["double_top_breakout", "ascending_triple_top_breakout", "triple_top_breakout", "spread_triple_top_breakout", "quadruple_top_breakout"]
-    bearish_names = ["double_bottom_breakdown", "descending_triple_bottom_breakdown", "triple_bottom_breakdown", "spread_triple_bottom_breakdown", "quadruple_bottom_breakdown"]
-
     bullish_trigger_str = "   "
     bearish_trigger_str = "   "
     for i in stock_triggers:
         for j in stock_triggers[i]:
-            if j[0] in bullish_names:
+            if j[0] in BULLISH_NAMES:
                 bullish_trigger_str = bullish_trigger_str + i + " - " + j[0] + " at column " + str(j[1]) + " in the graph" + "\n" + "   "
             else:
                 bearish_trigger_str = bearish_trigger_str + i + " - " + j[0] + " at column " + str(j[1]) + " in the graph" + "\n" + "   "
 
     #Write triggers to a txt file:
     triggers_txt = "Bullish triggers:" + "\n" + bullish_trigger_str + "\n\n" + "Bearish triggers:"  "\n" + bearish_trigger_str +  "\n\n" 
-    tr_file_path = "trigger_lists/triggers_{}.txt".format(str(dt.datetime.today())[:-7]).replace(":", "_").replace("-", "_").replace(" ", "_")
+    tr_file_path = triggers_file_path("txt")
     print(triggers_txt.split("\n"))
 
     with open(tr_file_path, 'w') as f:
@@ -502,19 +972,8 @@ if __name__ == '__main__':
         if output is None:
             sys.exit()
 
-        lines = [] #Format: ( x_start, x_end, y_start, y_end )
-        temp_triggers = stock_triggers[output]
-        temp_pnf_data = pnf_obj_dic[output].pnf_data
-
-        for i in temp_triggers:
-            x_start = i[1]
-            x_end = i[1] + i[2]
-            y_start = temp_pnf_data.loc[x_start, "close"]
-            y_end = y_start
-            lines.append((x_start, x_end, y_start, y_end))
-
         pnf_obj_dic[output].create_plot_from_pnf_data(figure_size=(12, 6),
                                    chart_name=output,
                                    grid_freq_y=5,
                                    grid_freq_x=5,
-                                    lines = lines)
+                                    lines = trigger_lines(pnf_obj_dic[output], stock_triggers[output]))
@@ -0,0 +1,33 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from pnf_triggers import PnfAnalysis
+
+# Reference charts in data/pnf_reference.json: a few short price series (random walks, trends, a High = Low = Close
+# series) with the columns, closing dates and triggers that the original row by row pandas implementation of
+# create_pnf_data and check_triggers gave for them, for a given box size and reversal amount. The original code
+# needs DataFrame.append (pandas < 2), so the expected values are saved instead of computed here.
+with open(os.path.join(os.path.dirname(__file__), "data", "pnf_reference.json"), "r") as f:
+    REFERENCE = json.load(f)
+
+
+def reference_data(name):
+    series = REFERENCE["series"][name]
+    return pd.DataFrame({"High": series["high"], "Low": series["low"], "Close": series["close"]},
+                        index=pd.DatetimeIndex(pd.to_datetime(series["dates"]), name="Date"))
+
+
+@pytest.mark.parametrize("case", REFERENCE["cases"],
+                         ids=lambda case: "{}-{}-{}".format(case["series"], case["box_size"], case["reversal_amount"]))
+def test_same_chart_and_triggers_as_the_original(case):
+    pnf_obj = PnfAnalysis(case["series"], box_size=case["box_size"], reversal_amount=case["reversal_amount"],
+                          spread_trigger_wide=case["spread_trigger_wide"], get_data=False,
+                          data=reference_data(case["series"]))
+
+    assert np.array_equal(pnf_obj.pnf_data.open.to_numpy(), np.array(case["open"]))
+    assert np.array_equal(pnf_obj.pnf_data.close.to_numpy(), np.array(case["close"]))
+    assert list(pnf_obj.pnf_data.index) == list(range(1, len(case["open"]) + 1))
+    assert [str(date.date()) for date in pnf_obj.closing_dates_list] == case["closing_dates"]
+    assert pnf_obj.check_triggers() == [tuple(trg) for trg in case["triggers"]]
@@ -0,0 +1,75 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from pnf_triggers import PnfAnalysis
+from pnf_bench import random_ohlc
+from pnf_cache import ResultCache
+
+
+def assert_same_chart(pnf_obj, reference):
+    # Same bars, columns, closing dates and triggers (raw and without duplicates) as reference:
+    assert pnf_obj.data.equals(reference.data)
+    assert pnf_obj.pnf_data.equals(reference.pnf_data)
+    assert pnf_obj.closing_dates_list == reference.closing_dates_list
+    assert pnf_obj.raw_trigger_list == reference.raw_trigger_list
+    assert pnf_obj.trigger_list == reference.trigger_list
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_updates_in_random_chunks_match_a_full_build(seed):
+    # The bars are fed in chunks of random size (each chunk starts with a few bars that are already in the chart)
+    # and the chart is sometimes pickled and loaded between two updates, as in a service or a worker process.
+    rng = np.random.default_rng(seed)
+    volatility = [0.002, 0.01, 0.03][seed % 3]
+    spread_trigger_wide = [15, 8, 21][seed % 3]
+    data = random_ohlc(int(rng.integers(50, 1500)), volatility=volatility, seed=seed)
+
+    n = int(rng.integers(1, 20))
+    pnf_obj = PnfAnalysis("SYN", box_size=0.5, spread_trigger_wide=spread_trigger_wide, get_data=False,
+                          data=data.iloc[:n])
+    if (seed % 2 == 1):
+        pnf_obj.check_triggers()
+    while (n < len(data)):
+        size = int(rng.integers(1, 40))
+        pnf_obj.update(data.iloc[max(0, n - 3):n + size])
+        n += size
+        if (rng.random() < 0.2):
+            pnf_obj = pickle.loads(pickle.dumps(pnf_obj))
+    trigger_list = pnf_obj.update(data.iloc[-2:])
+
+    reference = PnfAnalysis("SYN", box_size=0.5, spread_trigger_wide=spread_trigger_wide, get_data=False, data=data)
+    assert trigger_list == reference.check_triggers()
+    assert_same_chart(pnf_obj, reference)
+
+
+def test_update_with_unsorted_and_repeated_dates():
+    data = random_ohlc(600, seed=4)
+    pnf_obj = PnfAnalysis("SYN", box_size=1.0, get_data=False, data=data.iloc[:500])
+    pnf_obj.check_triggers()
+    # The new bars in reverse order, some of them twice:
+    pnf_obj.update(pd.concat([data.iloc[500:], data.iloc[550:560]]).iloc[::-1])
+
+    reference = PnfAnalysis("SYN", box_size=1.0, get_data=False, data=data)
+    reference.check_triggers()
+    assert_same_chart(pnf_obj, reference)
+
+
+def test_update_of_a_cached_chart_leaves_the_cache_unchanged(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    data = random_ohlc(3000, seed=1)
+    first = PnfAnalysis("SYN", get_data=False, data=data.iloc[:2000], cache=cache)
+    first_triggers = list(first.check_triggers())
+    second = PnfAnalysis("SYN", get_data=False, data=data.iloc[:2000], cache=cache)
+    second.check_triggers()
+    for n in range(2000, 3000, 7):
+        second.update(data.iloc[n:n + 7])
+
+    reference = PnfAnalysis("SYN", box_size=second.box_size, get_data=False, data=data)
+    reference.check_triggers()
+    assert_same_chart(second, reference)
+    # The updates of the second chart did not change the first one or the cached results:
+    assert first.trigger_list == first_triggers
+    third = PnfAnalysis("SYN", get_data=False, data=data.iloc[:2000], cache=cache)
+    assert third.check_triggers() == first_triggers
+    assert third.pnf_data.equals(first.pnf_data)